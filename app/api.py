@@ -0,0 +1,156 @@
+import hashlib
+
+from django.db.models import prefetch_related_objects
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+
+from app.cards import listing_version, object_versions
+from app.models import Answer, Question, Tag
+from app.pagination import CursorPaginator
+from app.views import ANSWERS_ORDERING, QUESTIONS_HOT_ORDERING, QUESTIONS_NEW_ORDERING
+
+# JSON API v1 только для чтения: списки вопросов, вопрос с ответами, теги.
+# Сериализаторы собирают словари из строк, уже загруженных listing() и одним
+# prefetch тегов, без запросов на каждую запись. ETag строится из версий app/cards.py:
+# списки - из общей listing_version, вопрос - из его версии thread, которая меняется
+# с ним, его ответами и голосами за них (обе проверки без обращения к базе). Клиент, который
+# опрашивает API с If-None-Match, получает 304 вместо повторной сборки страницы.
+# Смена имени или аватара автора попадает в ответ со следующим изменением версии
+
+API_PAGE_SIZE = 20
+API_TAGS_LIMIT = 100
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def listing_etag(request, **kwargs):
+    # Путь с курсором: у каждой страницы свой ETag
+    return make_etag(request.get_full_path(), listing_version())
+
+
+def question_etag(request, question_id):
+    # Без create: версию несуществующего вопроса не заводим, 404 отдает сам view
+    version = object_versions('thread', [question_id], create=False)[question_id]
+    if version is None:
+        return None
+    return make_etag(request.get_full_path(), version)
+
+
+def serialize_author(user):
+    profile = getattr(user, 'profile', None)
+    return {
+        'username': user.username,
+        'avatar': profile.avatar_64 if profile else '',
+    }
+
+
+def serialize_tag(tag):
+    return {
+        'name': tag.name,
+        'color': tag.get_color,
+        'question_count': tag.question_count,
+    }
+
+
+def serialize_question(question):
+    return {
+        'id': question.id,
+        'url': question.get_url(),
+        'title': question.title,
+        'text': question.text,
+        'author': serialize_author(question.author),
+        'tags': [tag.name for tag in question.tags.all()],
+        'created_at': question.created_at,
+        'like_count': question.like_count,
+        'dislike_count': question.dislike_count,
+        'rating': question.rating,
+        'answer_count': question.answer_count,
+    }
+
+
+def serialize_answer(answer):
+    return {
+        'id': answer.id,
+        'text': answer.text,
+        'author': serialize_author(answer.author),
+        'created_at': answer.created_at,
+        'is_correct': answer.is_correct,
+        'like_count': answer.like_count,
+        'dislike_count': answer.dislike_count,
+        'rating': answer.rating,
+    }
+
+
+def cursor_page(request, queryset, ordering):
+    return CursorPaginator(queryset, ordering, API_PAGE_SIZE).page(request.GET.get('cursor'))
+
+
+def question_list_response(request, questions, ordering, **extra):
+    page = cursor_page(request, questions, ordering)
+    prefetch_related_objects(page.object_list, 'tags')
+    return JsonResponse({
+        **extra,
+        'questions': [serialize_question(question) for question in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+# no-cache: клиент хранит ответ, но перед использованием проверяет ETag
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=listing_etag)
+def questions(request):
+    return question_list_response(request, Question.objects.listing(), QUESTIONS_NEW_ORDERING)
+
+
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=listing_etag)
+def hot_questions(request):
+    return question_list_response(request, Question.objects.listing(), QUESTIONS_HOT_ORDERING)
+
+
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=listing_etag)
+def tag_questions(request, tag_name):
+    try:
+        tag = Tag.objects.get(name=tag_name)
+    except Tag.DoesNotExist:
+        raise Http404("Tag not found")
+    questions = Question.objects.by_tag(tag).listing()
+    return question_list_response(request, questions, QUESTIONS_NEW_ORDERING, tag=serialize_tag(tag))
+
+
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=question_etag)
+def question(request, question_id):
+    question = get_object_or_404(Question.objects.listing(), pk=question_id)
+    # Версия появляется только у найденного вопроса. Этот ответ уходит без ETag:
+    # его могли собрать до изменения, которое новую версию уже сменило
+    object_versions('thread', [question_id])
+    prefetch_related_objects([question], 'tags')
+    page = cursor_page(request, Answer.objects.for_question(question).listing(), ANSWERS_ORDERING)
+    return JsonResponse({
+        'question': serialize_question(question),
+        'answers': [serialize_answer(answer) for answer in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=listing_etag)
+def tags(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', API_TAGS_LIMIT)), 1), API_TAGS_LIMIT)
+    except ValueError:
+        limit = API_TAGS_LIMIT
+    return JsonResponse({'tags': [serialize_tag(tag) for tag in Tag.objects.popular(limit)]})
@@ -1,6 +1,41 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def restore_search_triggers(using, **kwargs):
+    # SQLite пересоздает таблицу при части ALTER TABLE и теряет ее триггеры
+    from django.db import connections
+    from app.search import FTS_TABLE, install_search_index
+
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        install_search_index(connection)
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Любое сохранение пользователя или профиля (форма редактирования, админка,
+    # last_login при входе) сбрасывает снимок из app/backends.py
+    from app.backends import invalidate_user
+    from app.models import Profile
+
+    invalidate_user(instance.user_id if sender is Profile else instance.pk)
 
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        post_migrate.connect(restore_search_triggers, sender=self)
+
+        from app.instrumentation import install_query_tracker
+        from app.routers import install_write_tracker
+        connection_created.connect(install_query_tracker)
+        connection_created.connect(install_write_tracker)
+
+        from django.contrib.auth.models import User
+        from app.models import Profile
+        for model in (User, Profile):
+            post_save.connect(invalidate_cached_user, sender=model)
+            post_delete.connect(invalidate_cached_user, sender=model)
@@ -0,0 +1,195 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.template import engines
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# Сборка статики для продакшена (команда build_assets): в STATIC_ROOT попадают
+# только файлы, на которые ссылаются шаблоны ({% static %}), в уменьшенном виде,
+# с хэшем содержимого в имени и рядом с готовыми .gz/.br. Манифест совместим
+# с ManifestStaticFilesStorage, поэтому {% static %} сам подставляет хэшированные
+# имена. serve_asset отдает такие файлы с Cache-Control: immutable
+
+MANIFEST_NAME = 'staticfiles.json'
+HASH_LENGTH = 12
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MUTABLE_MAX_AGE = 60
+
+STATIC_TAG = re.compile(r"""\{%\s*static\s+(['"])(?P<path>[^'"]+)\1\s*%\}""")
+SOURCE_MAP = re.compile(r'^\s*(/\*# sourceMappingURL=.*?\*/|//# sourceMappingURL=.*)$', re.MULTILINE)
+HASHED_NAME = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}\.[^./]+$')
+
+
+def template_dirs():
+    dirs = []
+    for engine in engines.all():
+        dirs.extend(str(path) for path in engine.template_dirs)
+    return dirs
+
+
+def referenced_assets():
+    # Пути из {% static '...' %} во всех шаблонах проекта и приложений
+    paths = set()
+    for directory in template_dirs():
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if not name.endswith(('.html', '.txt', '.xml')):
+                    continue
+                with open(os.path.join(root, name), encoding='utf-8') as file:
+                    paths.update(match['path'].lstrip('/') for match in STATIC_TAG.finditer(file.read()))
+    return paths
+
+
+def assets_with_prefixes(prefixes):
+    # Файлы целых каталогов (например, admin/), подключаемые не через шаблоны
+    paths = set()
+    if not prefixes:
+        return paths
+    for finder in finders.get_finders():
+        for path, _ in finder.list(['CVS', '.*', '*~', '*.map']):
+            path = path.replace(os.sep, '/')
+            if path.startswith(tuple(prefixes)):
+                paths.add(path)
+    return paths
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    # Консервативно: комментарии, пробелы вокруг разделителей и пустые строки
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    # Без полноценного парсера безопасно убрать только отступы, пустые строки
+    # и строки-комментарии; переводы строк остаются ради автоподстановки ";"
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def process(path, content):
+    name, ext = posixpath.splitext(path)
+    if ext in ('.css', '.js'):
+        text = SOURCE_MAP.sub('', content.decode('utf-8'))
+        if not name.endswith('.min'):
+            text = minify_css(text) if ext == '.css' else minify_js(text)
+        content = text.encode('utf-8')
+    return content
+
+
+def hashed_name(path, content):
+    name, ext = posixpath.splitext(path)
+    return f'{name}.{hashlib.md5(content).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def write(root, path, content, compress):
+    full_path = os.path.join(root, *path.split('/'))
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as file:
+        file.write(content)
+    written = [(path, len(content))]
+    if not compress or posixpath.splitext(path)[1] not in COMPRESSIBLE:
+        return written
+
+    variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        # Сжатая копия нужна, только если она меньше оригинала
+        if len(compressed) < len(content):
+            with open(full_path + suffix, 'wb') as file:
+                file.write(compressed)
+            written.append((path + suffix, len(compressed)))
+    return written
+
+
+def build_assets(paths, root, compress=True):
+    # Возвращает манифест и список записанных файлов с размерами
+    manifest = {}
+    written = []
+    for path in sorted(paths):
+        source = finders.find(path)
+        if source is None:
+            raise FileNotFoundError(path)
+        with open(source, 'rb') as file:
+            content = process(path, file.read())
+        manifest[path] = hashed_name(path, content)
+        # Копия без хэша нужна для относительных url() внутри чужих CSS (admin)
+        written += write(root, path, content, compress=False)
+        written += write(root, manifest[path], content, compress)
+
+    manifest_hash = hashlib.md5(json.dumps(sorted(manifest.items())).encode()).hexdigest()[:HASH_LENGTH]
+    with open(os.path.join(root, MANIFEST_NAME), 'w') as file:
+        json.dump({'paths': manifest, 'version': '1.1', 'hash': manifest_hash}, file, indent=2, sort_keys=True)
+    return manifest, written
+
+
+class AssetStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        # Файлы вне манифеста (не собранные build_assets) отдаются под исходным
+        # именем, а не роняют рендеринг шаблона
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+def serve_asset(request, path):
+    # Раздача собранной статики самим Django, когда перед ним нет веб-сервера
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    encoding = None
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for suffix, name in (('.br', 'br'), ('.gz', 'gzip')):
+        if name in accept_encoding and os.path.isfile(full_path + suffix):
+            encoding = name
+            full_path += suffix
+            break
+
+    content_type, _ = mimetypes.guess_type(path)
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    if HASHED_NAME.search(path):
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={MUTABLE_MAX_AGE}'
+    return response
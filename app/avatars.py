@@ -0,0 +1,119 @@
+import hashlib
+import io
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Обработка аватаров при загрузке. Валидатор читает только заголовок файла
+# (Image.open не декодирует пиксели), затем форма декодирует картинку целиком
+# (decode_avatar): обрезанный или испорченный файл - ошибка формы, а не 500
+# при сохранении. Карточки показывают не оригинал, а
+# квадратные миниатюры AVATAR_SIZES в WebP и JPEG. Все файлы называются по хэшу
+# содержимого, поэтому повторная загрузка той же картинки ничего не пишет,
+# а смена аватара меняет URL (и ключ кэша карточек в app/cards.py).
+# EXIF, ICC и прочие метаданные не переносятся ни в миниатюры, ни в оригинал
+
+AVATAR_DIR = 'avatars'
+AVATAR_SIZES = (64, 128)
+AVATAR_FORMATS = {'JPEG': 'jpg', 'PNG': 'png'}
+AVATAR_MAX_PIXELS = 4096 * 4096
+HASH_LENGTH = 16
+
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+INVALID_IMAGE = 'Upload a valid JPG or PNG image.'
+
+
+def validate_avatar_header(value):
+    # Любая ошибка PIL (в том числе DecompressionBombError, он не OSError) -
+    # ошибка проверки, как в forms.ImageField
+    try:
+        image = Image.open(value)
+    except Exception:
+        raise ValidationError(INVALID_IMAGE)
+    finally:
+        value.seek(0)
+    if image.format not in AVATAR_FORMATS:
+        raise ValidationError(INVALID_IMAGE)
+    width, height = image.size
+    if width != height:
+        raise ValidationError('Image must be square (equal width and height).')
+    if width * height > AVATAR_MAX_PIXELS:
+        raise ValidationError('Image is too large, maximum is 4096x4096 pixels.')
+
+
+class DecodedAvatar:
+    __slots__ = ('hash', 'format', 'image')
+
+    def __init__(self, avatar_hash, image_format, image):
+        self.hash = avatar_hash
+        self.format = image_format
+        self.image = image
+
+
+def decode_avatar(uploaded):
+    data = uploaded.read()
+    try:
+        image = Image.open(io.BytesIO(data))
+        image_format = image.format
+        # Поворот из EXIF применяется к пикселям, потому что сам EXIF отбрасывается
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        # convert() декодирует все пиксели
+        image = image.convert('RGBA' if has_alpha and image_format == 'PNG' else 'RGB')
+    except Exception:
+        raise ValidationError(INVALID_IMAGE)
+    if image_format not in AVATAR_FORMATS:
+        raise ValidationError(INVALID_IMAGE)
+    return DecodedAvatar(hashlib.sha256(data).hexdigest()[:HASH_LENGTH], image_format, image)
+
+
+def avatar_name(avatar_hash, ext):
+    return f'{AVATAR_DIR}/{avatar_hash}.{ext}'
+
+
+def thumbnail_name(avatar_hash, size, ext):
+    return f'{AVATAR_DIR}/{avatar_hash}_{size}.{ext}'
+
+
+def encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def store(name, content):
+    if not default_storage.exists(name):
+        default_storage.save(name, content)
+
+
+def save_avatar(profile, avatar):
+    # avatar - результат decode_avatar. Записывает оригинал без метаданных и миниатюры,
+    # заполняет avatar и avatar_hash. Сам профиль сохраняет вызывающий
+    avatar_hash, image_format, image = avatar.hash, avatar.format, avatar.image
+
+    name = avatar_name(avatar_hash, AVATAR_FORMATS[image_format])
+    if image_format == 'PNG':
+        store(name, encode(image, 'PNG', optimize=True))
+    else:
+        store(name, encode(image, 'JPEG', quality=90, optimize=True))
+
+    # Миниатюры без прозрачности: белый фон, как у карточек
+    if image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    for size in AVATAR_SIZES:
+        thumbnail = image.resize((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for ext, (thumbnail_format, options) in THUMBNAIL_FORMATS.items():
+            store(thumbnail_name(avatar_hash, size, ext), encode(thumbnail, thumbnail_format, **options))
+
+    profile.avatar.name = name
+    profile.avatar_hash = avatar_hash
+    return profile
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from app.models import Profile
+
+# Бэкенд аутентификации, который берет пользователя текущей сессии вместе
+# с профилем из кэша. В кэше лежат только значения полей, без экземпляров
+# моделей. Снимок сбрасывается при редактировании профиля и выходе
+# (invalidate_user), в остальных случаях живет AUTH_USER_CACHE_TIMEOUT секунд.
+# Хэш пароля в кэш не попадает: вместо него хранятся уже посчитанные хэши для
+# проверки сессии, а поле password у восстановленного пользователя отложено
+# (save() его не перезаписывает)
+
+def user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+def snapshot(obj):
+    return {field.attname: getattr(obj, field.attname) for field in obj._meta.concrete_fields}
+
+def user_snapshot(user):
+    data = snapshot(user)
+    del data['password']
+    return data
+
+def session_auth_hashes(user):
+    # Текущий хэш и хэши для SECRET_KEY_FALLBACKS, их сверяет auth.get_user
+    return [user.get_session_auth_hash(), *user.get_session_auth_fallback_hash()]
+
+def restore(data):
+    user = User.from_db(None, list(data['user']), list(data['user'].values()))
+    hashes = data['session_auth_hashes']
+    # Без обращения к отложенному полю password (это был бы запрос к базе)
+    user.get_session_auth_hash = lambda: hashes[0]
+    user.get_session_auth_fallback_hash = lambda: iter(hashes[1:])
+    profile = None
+    if data['profile'] is not None:
+        profile = Profile(**data['profile'])
+        profile._state.adding = False
+        # Напрямую в кэш связи: присваивание profile.user спрашивает роутер о записи
+        Profile.user.field.set_cached_value(profile, user)
+    # None в кэше связи - это "профиля нет", без запроса к базе
+    Profile.user.field.remote_field.set_cached_value(user, profile)
+    return user
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        data = cache.get(user_cache_key(user_id))
+        # Снимок старого формата (с хэшем пароля) пересобирается
+        if data is not None and 'session_auth_hashes' in data:
+            user = restore(data)
+            return user if self.user_can_authenticate(user) else None
+
+        try:
+            user = User._default_manager.select_related('profile').get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        profile = getattr(user, 'profile', None)
+        cache.set(user_cache_key(user_id), {
+            'user': user_snapshot(user),
+            'session_auth_hashes': session_auth_hashes(user),
+            'profile': snapshot(profile) if profile is not None else None,
+        }, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,103 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Кэш отрендеренных карточек вопросов и ответов. Ключ фрагмента включает версию
+# объекта, которая меняется при голосовании, новом ответе, смене тегов или
+# правильного ответа (bump_*), а также автора - его имя и аватар хранятся в строке,
+# уже загруженной select_related. Теплая страница - это запрос строк и два get_many.
+# Любой сброс версии карточки сбрасывает и общую версию списков (listing_version):
+# по ней API (app/api.py) отвечает 304, не выполняя запрос страницы.
+# Версия thread вопроса меняется вместе с ним и с любым его ответом.
+
+LISTING_VERSION_KEY = 'listing_version'
+
+def version_key(kind, object_id):
+    return f'{kind}_card_version:{object_id}'
+
+def new_version():
+    # Уникальное значение, а не счетчик: если версия вытеснена из кэша,
+    # новая не совпадет со старыми фрагментами
+    return time.time_ns()
+
+def bump(kind, *object_ids, threads=()):
+    versions = {version_key(kind, object_id): new_version() for object_id in object_ids}
+    versions.update((version_key('thread', question_id), new_version()) for question_id in threads)
+    versions[LISTING_VERSION_KEY] = new_version()
+    cache.set_many(versions, None)
+
+def bump_listings():
+    # Для команд, которые меняют порядок или счетчики без сброса карточек
+    cache.set(LISTING_VERSION_KEY, new_version(), None)
+
+def listing_version():
+    version = cache.get(LISTING_VERSION_KEY)
+    if version is None:
+        version = new_version()
+        # add, а не set: параллельный bump() не должен потеряться
+        if not cache.add(LISTING_VERSION_KEY, version, None):
+            version = cache.get(LISTING_VERSION_KEY, version)
+    return version
+
+# threads - вопросы, страница которых изменилась целиком (версия thread
+# для кэша страниц в app/pagecache.py); у вопроса она сбрасывается всегда
+def bump_question_card(*question_ids, threads=()):
+    bump('question', *question_ids, threads={*question_ids, *threads})
+
+def bump_answer_card(*answer_ids, threads=()):
+    bump('answer', *answer_ids, threads=threads)
+
+def card_versions(kind, objects):
+    return object_versions(kind, [obj.pk for obj in objects])
+
+def object_versions(kind, object_ids, create=True):
+    # Без create отсутствующая версия - None, ничего не записывается
+    keys = {object_id: version_key(kind, object_id) for object_id in object_ids}
+    versions = cache.get_many(keys.values())
+    if not create:
+        return {object_id: versions.get(key) for object_id, key in keys.items()}
+    missing = {key: new_version() for key in keys.values() if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {object_id: versions[key] for object_id, key in keys.items()}
+
+def fragment_key(kind, obj, version, *vary_on):
+    profile = getattr(obj.author, 'profile', None)
+    avatar = profile.avatar.name if profile and profile.avatar else ''
+    return make_template_fragment_key(f'{kind}_card', [obj.pk, version, obj.author.username, avatar, *vary_on])
+
+def render_cards(kind, objects, template, context, vary_on=(), prefetch=()):
+    versions = card_versions(kind, objects)
+    keys = {obj.pk: fragment_key(kind, obj, versions[obj.pk], *vary_on) for obj in objects}
+    cards = cache.get_many(keys.values())
+
+    missing = [obj for obj in objects if keys[obj.pk] not in cards]
+    if missing:
+        prefetch_related_objects(missing, *prefetch)
+        fresh = {
+            keys[obj.pk]: render_to_string(template, {kind: obj, **context})
+            for obj in missing
+        }
+        cache.set_many(fresh, settings.CARD_CACHE_TIMEOUT)
+        cards.update(fresh)
+
+    for obj in objects:
+        obj.card = mark_safe(cards[keys[obj.pk]])
+    return objects
+
+def render_question_cards(questions):
+    return render_cards('question', list(questions), 'layouts/question.html', {}, prefetch=['tags'])
+
+def render_answer_cards(answers, question, can_mark_correct):
+    # Кнопка "Correct!" видна только автору вопроса - это отдельный вариант карточки
+    return render_cards(
+        'answer', list(answers), 'layouts/answer.html',
+        {'question': question, 'can_mark_correct': can_mark_correct},
+        vary_on=[can_mark_correct],
+    )
@@ -1,6 +1,8 @@
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 
+from app.cards import bump_answer_card
+from app.events import publish_question_event
 from app.models import Answer, Question
 
 def setRightAnswerResponse(request, answer_id):
@@ -17,14 +19,19 @@ def setRightAnswerResponse(request, answer_id):
         if answer.is_correct and not is_correct:
             answer.is_correct = False
             answer.save()
+            bump_answer_card(answer.id, threads=[question.id])
+            publish_question_event(question.id, 'correct', {'id': answer.id, 'is_correct': False, 'unmarked': []})
             return JsonResponse({
                 "is_correct": False,
             })
         
         if not answer.is_correct and is_correct:
-            Answer.objects.filter(question=question).update(is_correct=False)
+            previous = list(Answer.objects.filter(question=question, is_correct=True).values_list('id', flat=True))
+            Answer.objects.filter(id__in=previous).update(is_correct=False)
             answer.is_correct = True
             answer.save()
+            bump_answer_card(answer.id, *previous, threads=[question.id])
+            publish_question_event(question.id, 'correct', {'id': answer.id, 'is_correct': True, 'unmarked': previous})
             return JsonResponse({
                 "is_correct": True
             })
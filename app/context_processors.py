@@ -1,10 +1,13 @@
-from app.models import Tag, User
-from django.core.cache import cache
+from app.models import Tag
+from django.conf import settings
 
 # Глобальный контекст
 def global_context(request):
-    popular_tags = Tag.objects.popular()
+    # Передаем метод, а не список: шаблон вызовет его, только если
+    # отрендеренный сайдбар выпал из кэша
+    popular_tags = Tag.objects.cached_popular
     #user = request.user
     return {
         'popular_tags': popular_tags,
+        'popular_tags_timeout': settings.POPULAR_TAGS_TIMEOUT,
     }
\ No newline at end of file
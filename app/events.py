@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.module_loading import import_string
+
+# Публикация событий страницы вопроса (голоса, новые ответы, правильный ответ)
+# для SSE-потока views.question_events. Публиковать можно из любого потока:
+# из views, из потока сброса голосов app/votes.py. Подписчики живут в цикле
+# событий ASGI. LocalBroker работает внутри одного процесса; при нескольких
+# процессах EVENT_BROKER заменяется брокером с тем же publish/subscribe
+# поверх внешнего pub/sub (например, Redis)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def events_enabled(request):
+    # Поток держит соединение открытым сколько угодно долго. Под WSGI это
+    # навсегда занятый воркер, а ответ до клиента не доходит вовсе, поэтому
+    # поток включается только под ASGI
+    return settings.QUESTION_EVENTS and isinstance(request, ASGIRequest)
+
+
+def question_channel(question_id):
+    return f'question:{question_id}'
+
+
+def format_event(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class Subscription:
+    def __init__(self, broker, channel, loop):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self.put, message)
+        except RuntimeError:
+            # Цикл событий уже закрыт - клиент отключился
+            self.broker.unsubscribe(self)
+
+    def put(self, message):
+        if self.queue.full():
+            # Медленный клиент теряет самые старые события, а не тормозит остальных
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, asyncio.get_running_loop())
+        with self.lock:
+            self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            channel = self.subscribers.get(subscription.channel)
+            if channel is not None:
+                channel.discard(subscription)
+                if not channel:
+                    del self.subscribers[subscription.channel]
+
+    def publish(self, channel, event_type, data):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        if subscribers:
+            message = format_event(event_type, data)
+            for subscription in subscribers:
+                subscription.deliver(message)
+
+
+broker = import_string(settings.EVENT_BROKER)()
+
+
+def publish_question_event(question_id, event_type, data):
+    broker.publish(question_channel(question_id), event_type, data)
@@ -0,0 +1,37 @@
+import random
+
+# Генераторы строк для команды fill_db, которые выполняются в пуле процессов.
+# В модуле нет импортов Django: при запуске пула через spawn (macOS, Windows)
+# дочерний процесс импортирует только его, без django.setup()
+
+# Состояние процессов-генераторов, задается через initializer пула
+_context = {}
+
+def init_worker(context):
+    _context.update(context)
+
+def question_rows(task):
+    start, count, seed = task
+    rnd = random.Random(seed)
+    sentences, user_ids = _context['sentences'], _context['user_ids']
+    return [
+        (
+            rnd.choice(sentences)[:98].rstrip('.') + '?',
+            ' '.join(rnd.choices(sentences, k=rnd.randint(2, 6))),
+            rnd.choice(user_ids),
+        )
+        for _ in range(count)
+    ]
+
+def answer_rows(task):
+    start, count, seed = task
+    rnd = random.Random(seed)
+    sentences, user_ids, question_ids = _context['sentences'], _context['user_ids'], _context['question_ids']
+    return [
+        (
+            ' '.join(rnd.choices(sentences, k=rnd.randint(1, 5))),
+            rnd.choice(question_ids),
+            rnd.choice(user_ids),
+        )
+        for _ in range(count)
+    ]
@@ -4,8 +4,10 @@ from django import forms
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
-from PIL import Image
+from django.db import transaction
+from django.urls import reverse_lazy
 import os
+from app.avatars import decode_avatar, save_avatar, validate_avatar_header
 from app.models import Answer, Profile, Question
 
 def validate_image_size(value):
@@ -13,12 +15,6 @@ def validate_image_size(value):
     if value.size > limit:
         raise ValidationError('File too large. Size should not exceed 2 MB.')
 
-def validate_image_dimensions(value):
-    img = Image.open(value)
-    width, height = img.size
-    if width != height:
-        raise ValidationError('Image must be square (equal width and height).')
-
 class LoginForm(forms.Form):
     username = forms.CharField(max_length=30, required=True)
     password = forms.CharField(widget=forms.PasswordInput, required=True)
@@ -51,14 +47,15 @@ class UserForm(forms.ModelForm):
         help_text='Minimum 8 characters'
     )
     
-    avatar = forms.ImageField(
+    # FileField, а не ImageField: ImageField проверяет картинку через verify() по всему файлу
+    avatar = forms.FileField(
         required=False,
         widget=forms.FileInput(attrs={'accept': 'image/*'}),
         help_text='JPG, JPEG or PNG, max 2MB, square image',
         validators=[
             FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png']),
             validate_image_size,
-            validate_image_dimensions
+            validate_avatar_header
         ]
     )
 
@@ -66,6 +63,11 @@ class UserForm(forms.ModelForm):
         model = User
         fields = ['username', 'email', 'password', 'password_repeat', 'avatar']
 
+    def clean_avatar(self):
+        # Заголовок уже проверен валидаторами, здесь картинка декодируется целиком
+        avatar = self.cleaned_data.get('avatar')
+        return decode_avatar(avatar) if avatar else None
+
     def clean(self):
         cleaned_data = super().clean()
         password = cleaned_data.get('password')
@@ -83,11 +85,14 @@ class UserForm(forms.ModelForm):
         user = super().save(commit=False)
         user.set_password(self.cleaned_data['password'])
         if commit:
-            user.save()
-            Profile.objects.create(
-                user=user,
-                avatar=self.cleaned_data.get('avatar')
-            )
+            # Пользователь без профиля не должен остаться в базе
+            with transaction.atomic():
+                user.save()
+                profile = Profile(user=user)
+                avatar = self.cleaned_data.get('avatar')
+                if avatar is not None:
+                    save_avatar(profile, avatar)
+                profile.save()
         return user
 
 class UserEditForm(forms.ModelForm):
@@ -109,14 +114,15 @@ class UserEditForm(forms.ModelForm):
         widget=forms.PasswordInput(attrs={'placeholder': 'Repeat new password if changing'})
     )
     
-    avatar = forms.ImageField(
+    # FileField, а не ImageField: ImageField проверяет картинку через verify() по всему файлу
+    avatar = forms.FileField(
         required=False,
         widget=forms.FileInput(attrs={'accept': 'image/*'}),
         help_text='JPG, JPEG or PNG, max 2MB, square image (leave blank to keep current)',
         validators=[
             FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png']),
             validate_image_size,
-            validate_image_dimensions
+            validate_avatar_header
         ]
     )
 
@@ -131,6 +137,11 @@ class UserEditForm(forms.ModelForm):
         if hasattr(self.instance, 'profile'):
             self.initial_avatar = self.instance.profile.avatar
             
+    def clean_avatar(self):
+        # Заголовок уже проверен валидаторами, здесь картинка декодируется целиком
+        avatar = self.cleaned_data.get('avatar')
+        return decode_avatar(avatar) if avatar else None
+
     def clean(self):
         cleaned_data = super().clean()
         new_password = cleaned_data.get('new_password')
@@ -181,21 +192,27 @@ class UserEditForm(forms.ModelForm):
             user.set_password(new_password)
 
         if commit:
-            user.save()
+            with transaction.atomic():
+                user.save()
 
-            avatar = self.cleaned_data.get('avatar')
-            if avatar is not None:
-                if profile is None:
-                    profile = Profile(user=user)
-                profile.avatar = avatar
-                profile.save()
+                avatar = self.cleaned_data.get('avatar')
+                if avatar is not None:
+                    if profile is None:
+                        profile = Profile(user=user)
+                    save_avatar(profile, avatar)
+                    profile.save()
 
         return user
 
 class AskForm(forms.ModelForm):
     tags = forms.CharField(
         required=False,
-        widget=forms.TextInput(attrs={'placeholder': 'Enter the tags separated by commas'}),
+        widget=forms.TextInput(attrs={
+            'placeholder': 'Enter the tags separated by commas',
+            'autocomplete': 'off',
+            'list': 'tag-suggestions',
+            'data-tag-suggest': reverse_lazy('tag_suggest'),
+        }),
         help_text='1 to 3 comma-separated tags'
     )
 
@@ -0,0 +1,199 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+# Замеры каждого запроса: число запросов к базе и время SQL (через
+# execute_wrapper на каждом соединении), время рендеринга шаблонов (через
+# InstrumentedDjangoTemplates) и самый медленный запрос. Результат уходит в заголовок Server-Timing, в лог
+# app.instrumentation строкой key=value и в кольцевой буфер по каждому view,
+# из которого request_stats считает перцентили. На запрос - пара perf_counter()
+# и одно сравнение на каждый SQL-запрос, строки SQL не форматируются
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_metrics', default=None)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+SLOWEST_SQL_LENGTH = 500
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'sql_time', 'render_time', 'render_depth', 'slowest_time', 'slowest_sql')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.slowest_time = 0.0
+        self.slowest_sql = ''
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql
+
+
+def track_queries(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_tracker(sender, connection, **kwargs):
+    # Обертка на все время жизни соединения: соединения свои у каждого потока,
+    # и под ASGI view выполняется в потоке sync_to_async с соединением, которого
+    # в момент входа в middleware еще нет. Текущие замеры берутся из ContextVar
+    if track_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_queries)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Вложенный рендеринг уже входит во время внешнего
+        metrics.render_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_depth -= 1
+            if not metrics.render_depth:
+                metrics.render_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    # Шаблонный бэкенд Django, который засчитывает время render() в текущий запрос.
+    # Время контекстных процессоров (global_context) входит в рендеринг страницы
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+def percentile(values, percent):
+    # Метод ближайшего ранга, без интерполяции
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def record(view_name, sample):
+    with _stats_lock:
+        samples = _stats.get(view_name)
+        if samples is None:
+            samples = _stats[view_name] = deque(maxlen=settings.INSTRUMENTATION_BUFFER_SIZE)
+        samples.append(sample)
+
+
+def view_stats():
+    with _stats_lock:
+        snapshot = {name: list(samples) for name, samples in _stats.items()}
+
+    result = {}
+    for name, samples in sorted(snapshot.items()):
+        total, sql, render, queries = (
+            [sample[i] for sample in samples] for i in range(4)
+        )
+        result[name] = {
+            'requests': len(samples),
+            'total_ms': {f'p{p}': round(percentile(total, p), 3) for p in (50, 95, 99)},
+            'sql_ms': {f'p{p}': round(percentile(sql, p), 3) for p in (50, 95, 99)},
+            'render_ms': {f'p{p}': round(percentile(render, p), 3) for p in (50, 95, 99)},
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+        }
+    return result
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def server_timing(metrics, total):
+    return (
+        f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries", '
+        f'tpl;dur={metrics.render_time * 1000:.1f}, '
+        f'total;dur={total * 1000:.1f}'
+    )
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def report(self, request, response, metrics, total):
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        response['Server-Timing'] = server_timing(metrics, total)
+        record(view_name, (total * 1000, metrics.sql_time * 1000, metrics.render_time * 1000, metrics.queries))
+
+        if logger.isEnabledFor(logging.INFO):
+            slowest_sql = ' '.join(metrics.slowest_sql.split())[:SLOWEST_SQL_LENGTH].replace('"', "'")
+            fields = {
+                'view': view_name,
+                'method': request.method,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'sql_ms': round(metrics.sql_time * 1000, 2),
+                'queries': metrics.queries,
+                'render_ms': round(metrics.render_time * 1000, 2),
+                'slowest_sql_ms': round(metrics.slowest_time * 1000, 2),
+            }
+            logger.info(
+                ' '.join(f'{key}={value}' for key, value in fields.items()) + f' slowest_sql="{slowest_sql}"',
+                extra={'metrics': {**fields, 'slowest_sql': slowest_sql}},
+            )
@@ -0,0 +1,187 @@
+import json
+import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from app.instrumentation import RequestMetrics, percentile
+from app.models import Answer, Profile, Question, Tag
+
+BENCH_USERNAME = 'benchmark'
+
+
+def make_client(user, host):
+    client = Client(SERVER_NAME=host)
+    client.force_login(user)
+    return client
+
+
+def endpoints(user):
+    # (имя, метод, url, данные) для каждого маршрута из app/urls.py, который нагружает базу
+    question = Question.objects.order_by('-answer_count', 'id').first()
+    tag = Tag.objects.order_by('-question_count', 'id').first()
+    if question is None or tag is None:
+        raise CommandError('Database is empty: pass --ratio to seed it first')
+    answer = Answer.objects.filter(question=question).order_by('id').first()
+
+    # Для mark_correct нужен вопрос пользователя бенчмарка
+    own_question = Question.objects.filter(author=user).first()
+    if own_question is None:
+        own_question = Question.objects.create(title='Benchmark question?', text='Text', author=user)
+        own_question.tags.add(tag)
+    own_answer = Answer.objects.filter(question=own_question).first()
+    if own_answer is None:
+        own_answer = Answer.objects.create(question=own_question, author=user, text='Benchmark answer')
+
+    result = [
+        ('index', 'get', reverse('index'), None),
+        ('hot', 'get', reverse('hot'), None),
+        ('tag', 'get', reverse('tag', args=[tag.name]), None),
+        ('question', 'get', reverse('question', args=[question.id]), None),
+        ('search', 'get', reverse('search') + '?q=' + question.title.split()[0], None),
+        ('question_like', 'post', reverse('question_like', args=[question.id]), {'action': 'like'}),
+        ('mark_correct', 'post', reverse('mark_correct', args=[own_answer.id]),
+            {'question': own_question.id, 'is_correct': 'true'}),
+        ('ask', 'post', reverse('ask'), {'title': 'Benchmark?', 'text': 'Text', 'tags': tag.name}),
+    ]
+    if answer is not None:
+        result.insert(6, ('answer_like', 'post', reverse('answer_like', args=[answer.id]), {'action': 'like'}))
+    return result
+
+
+def measure(client, method, url, data):
+    # Время SQL - сумма perf_counter() по каждому запросу, как в InstrumentationMiddleware:
+    # captured_queries хранит время строкой с точностью до миллисекунды
+    metrics = RequestMetrics()
+    with connection.execute_wrapper(metrics):
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data) if data else getattr(client, method)(url)
+        elapsed = time.perf_counter() - started
+    return elapsed, metrics.queries, metrics.sql_time, response.status_code
+
+
+def summarize(samples):
+    latencies = [sample[0] * 1000 for sample in samples]
+    query_counts = [sample[1] for sample in samples]
+    sql_times = [sample[2] * 1000 for sample in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[3] >= 400),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries_mean': round(sum(query_counts) / len(query_counts), 2),
+        'queries_max': max(query_counts),
+        'sql_ms_mean': round(sum(sql_times) / len(sql_times), 3),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every view through the test client and write latency and query stats to JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ratio', type=int, default=None,
+            help='Seed the database with fill_db at this ratio before measuring')
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel client threads')
+        parser.add_argument('--only', nargs='*', default=None, help='Endpoint names to run')
+        parser.add_argument('--host', default='localhost', help='Host header, must be in ALLOWED_HOSTS')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', default=None, help='Previous JSON result to diff against')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['ratio']:
+            call_command('fill_db', kwargs['ratio'], stdout=self.stdout)
+
+        user, created = User.objects.get_or_create(username=BENCH_USERNAME)
+        if created:
+            Profile.objects.create(user=user)
+
+        results = {}
+        # Все запросы идут от одного пользователя: с лимитами (app/ratelimit.py)
+        # замерялись бы ответы 429, а не сами view
+        with override_settings(RATE_LIMITS={}):
+            for name, method, url, data in endpoints(user):
+                if kwargs['only'] and name not in kwargs['only']:
+                    continue
+                samples = self.run_endpoint(user, kwargs, method, url, data)
+                results[name] = summarize(samples)
+                self.report(name, results[name])
+
+        output = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'ratio': kwargs['ratio'],
+                'requests': kwargs['requests'],
+                'concurrency': kwargs['concurrency'],
+                'questions': Question.objects.count(),
+            },
+            'endpoints': results,
+        }
+        with open(kwargs['output'], 'w') as file:
+            json.dump(output, file, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {kwargs["output"]}'))
+
+        if kwargs['compare']:
+            self.compare(kwargs['compare'], results)
+
+    def run_endpoint(self, user, options, method, url, data):
+        def worker(count):
+            client = make_client(user, options['host'])
+            for _ in range(options['warmup']):
+                getattr(client, method)(url, data) if data else getattr(client, method)(url)
+            return [measure(client, method, url, data) for _ in range(count)]
+
+        concurrency = max(1, options['concurrency'])
+        if concurrency == 1:
+            return worker(options['requests'])
+
+        def threaded_worker(count):
+            try:
+                return worker(count)
+            finally:
+                # У каждого потока пула свое соединение с базой
+                connections.close_all()
+
+        per_worker = [options['requests'] // concurrency] * concurrency
+        for i in range(options['requests'] % concurrency):
+            per_worker[i] += 1
+        with ThreadPoolExecutor(concurrency) as pool:
+            return [sample for samples in pool.map(threaded_worker, per_worker) for sample in samples]
+
+    def report(self, name, stats):
+        line = (
+            f'{name:<15} p50 {stats["p50_ms"]:>8.2f} ms  p95 {stats["p95_ms"]:>8.2f} ms  '
+            f'p99 {stats["p99_ms"]:>8.2f} ms  queries {stats["queries_mean"]:>6.1f}  '
+            f'sql {stats["sql_ms_mean"]:>7.2f} ms'
+        )
+        if stats['errors']:
+            self.stdout.write(self.style.ERROR(f'{line}  errors {stats["errors"]}'))
+        else:
+            self.stdout.write(line)
+
+    def compare(self, path, results):
+        with open(path) as file:
+            previous = json.load(file)['endpoints']
+        self.stdout.write(f'\nChange against {path}:')
+        for name, stats in results.items():
+            if name not in previous:
+                continue
+            old = previous[name]
+            deltas = []
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_mean'):
+                if old[key]:
+                    deltas.append(f'{key} {(stats[key] - old[key]) / old[key] * 100:+.1f}%')
+                else:
+                    deltas.append(f'{key} {stats[key] - old[key]:+}')
+            self.stdout.write(f'{name:<15} ' + '  '.join(deltas))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from app.assets import assets_with_prefixes, brotli, build_assets, referenced_assets
+
+
+class Command(BaseCommand):
+    help = 'Collect the static files referenced by templates into STATIC_ROOT: minified, hashed and precompressed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--include', nargs='*', default=['admin/'],
+            help='Also collect every static file under these prefixes')
+        parser.add_argument('--no-compress', action='store_true', help='Skip .gz/.br variants')
+
+    def handle(self, *args, **kwargs):
+        if not settings.STATIC_ROOT:
+            raise CommandError('STATIC_ROOT is not set')
+        if brotli is None and not kwargs['no_compress']:
+            self.stdout.write(self.style.WARNING('brotli is not installed, writing only .gz variants'))
+
+        referenced = referenced_assets()
+        paths = referenced | assets_with_prefixes(kwargs['include'])
+        try:
+            manifest, written = build_assets(paths, settings.STATIC_ROOT, compress=not kwargs['no_compress'])
+        except FileNotFoundError as error:
+            raise CommandError(f'Referenced static file not found: {error}')
+
+        for path in sorted(referenced):
+            self.stdout.write(f'{path} -> {manifest[path]}')
+        total = sum(size for _, size in written)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(manifest)} assets, {len(written)} files, {total / 1024:.0f} KiB written to {settings.STATIC_ROOT}'
+        ))
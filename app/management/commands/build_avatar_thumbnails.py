@@ -0,0 +1,22 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from app.avatars import decode_avatar, save_avatar
+from app.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Strip metadata and build avatar thumbnails for profiles uploaded before the avatar pipeline'
+
+    def handle(self, *args, **kwargs):
+        processed = 0
+        profiles = Profile.objects.exclude(avatar='').exclude(avatar__isnull=True).filter(avatar_hash='')
+        for profile in profiles.iterator():
+            try:
+                with profile.avatar.open('rb') as avatar:
+                    save_avatar(profile, decode_avatar(avatar))
+            except (OSError, ValidationError) as error:
+                self.stdout.write(self.style.WARNING(f'Skipped {profile}: {error}'))
+                continue
+            profile.save(update_fields=['avatar', 'avatar_hash'])
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} avatars'))
@@ -0,0 +1,103 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from app.models import Answer, AnswerLike, Question, QuestionLike, Tag
+from app.pagination import CursorPaginator
+from app.views import ANSWERS_ORDERING, QUESTIONS_HOT_ORDERING, QUESTIONS_NEW_ORDERING
+
+# Полное сканирование таблицы в выводе EXPLAIN. Для SQLite "SCAN t USING INDEX"
+# - это обход индекса в нужном порядке, он не считается
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)(?:\s|$)'),
+}
+
+
+def deep_page(queryset, ordering):
+    # Запрос страницы по курсору: ключ берется из середины выборки
+    paginator = CursorPaginator(queryset, ordering)
+    middle = queryset.order_by(*ordering)[queryset.count() // 2:].first()
+    if middle is None:
+        return queryset.order_by(*ordering)[:paginator.per_page]
+    key = [getattr(middle, field.attname) for field in paginator.fields]
+    return queryset.filter(paginator.seek(key, reverse=False)).order_by(*ordering)[:paginator.per_page]
+
+
+def view_queries():
+    # Основные запросы каждой страницы из app/views.py и менеджеров app/models.py
+    question = Question.objects.order_by('-answer_count').first()
+    tag = Tag.objects.order_by('-question_count').first()
+
+    queries = [
+        ('index', Question.objects.new().listing()[:10]),
+        ('index, deep page', deep_page(Question.objects.listing(), QUESTIONS_NEW_ORDERING)),
+        ('hot', Question.objects.hot().listing()[:10]),
+        ('hot, deep page', deep_page(Question.objects.listing(), QUESTIONS_HOT_ORDERING)),
+        ('popular tags', Tag.objects.popular()),
+    ]
+    if tag is not None:
+        queries += [
+            ('tag', Question.objects.by_tag(tag).listing()[:10]),
+        ]
+    if question is not None:
+        answers = Answer.objects.for_question(question).listing()
+        queries += [
+            ('question', Question.objects.listing().filter(pk=question.pk)),
+            ('question, answers', answers[:10]),
+            ('question, answers deep page', deep_page(answers, ANSWERS_ORDERING)),
+            ('mark correct', Answer.objects.filter(question=question, is_correct=True).values('id')),
+            ('question likes', QuestionLike.objects.filter(question=question, value=1)),
+        ]
+        answer = question.answer_set.first()
+        if answer is not None:
+            queries.append(('answer likes', AnswerLike.objects.filter(answer=answer, value=1)))
+    return queries
+
+
+def table_size(table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the queries behind each view and flag sequential scans on large tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=10000,
+            help='Only flag scans on tables with at least this many rows')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+
+    def handle(self, *args, **kwargs):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Unsupported database backend: {connection.vendor}')
+
+        sizes = {}
+        problems = []
+        for name, queryset in view_queries():
+            plan = queryset.explain()
+            if kwargs['verbose_plans']:
+                self.stdout.write(f'\n{name}:\n{plan}')
+
+            flagged = []
+            for table in set(pattern.findall(plan)):
+                if table not in sizes:
+                    sizes[table] = table_size(table)
+                if sizes[table] >= kwargs['min_rows']:
+                    flagged.append(f'{table} ({sizes[table]} rows)')
+
+            if flagged:
+                problems.append(name)
+                self.stdout.write(self.style.ERROR(f'SEQ SCAN  {name}: {", ".join(sorted(flagged))}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK        {name}'))
+
+        if problems:
+            raise CommandError(f'{len(problems)} queries scan large tables: {", ".join(problems)}')
+        self.stdout.write(self.style.SUCCESS('No sequential scans on large tables'))
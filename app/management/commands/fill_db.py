@@ -1,140 +1,82 @@
-# Время заполнения бд составило чуть меньше 6 минут
-from django.core.management.base import BaseCommand
+# Потоковое заполнение: строки генерируются и вставляются пачками по --batch-size,
+# поэтому память ограничена размером пачки и списками id, а не всей базой.
+# Тексты собираются из заранее сгенерированного Faker пула предложений:
+# сам Faker слишком медленный, чтобы вызывать его на каждую строку
+import io
+import random
+from array import array
+from multiprocessing import Pool
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from app.fill_rows import answer_rows, init_worker, question_rows
 from app.models import Profile, Tag, Question, Answer, QuestionLike, AnswerLike
 from faker import Faker
-import random
 
-fake = Faker()
+SENTENCE_POOL_SIZE = 5000
+TAG_COLORS = [code for code, _ in Tag.COLOR_CHOICES]
+
+def chunk_tasks(total, batch_size, seed):
+    return [
+        (start, min(batch_size, total - start), seed + start)
+        for start in range(0, total, batch_size)
+    ]
+
+def spread_votes(targets, total, max_per_target, rnd, batch_size):
+    # Число голосов на каждый объект: total голосов раскидываются случайно
+    # пачками, без хранения самих пар в памяти
+    counts = array('I', bytes(4 * targets))
+    for start in range(0, total, batch_size):
+        for index in rnd.choices(range(targets), k=min(batch_size, total - start)):
+            counts[index] += 1
+    for index in range(targets):
+        counts[index] = min(counts[index], max_per_target)
+    return counts
+
 
 class Command(BaseCommand):
     help = 'Fill database with test data'
 
     def add_arguments(self, parser):
         parser.add_argument('ratio', type=int, help='Ratio for data generation')
+        parser.add_argument('--batch-size', type=int, default=10000,
+            help='Rows generated and inserted per chunk')
+        parser.add_argument('--workers', type=int, default=0,
+            help='Generate question and answer rows in a pool of N processes')
+        parser.add_argument('--copy', action='store_true',
+            help='Insert with COPY FROM STDIN (PostgreSQL only)')
+        parser.add_argument('--seed', type=int, default=None)
 
     def handle(self, *args, **kwargs):
         ratio = kwargs['ratio']
-
-        # Заполнение профилей и пользователей
-        users = []
-        for i in range(ratio):
-            user = User(
-                username=fake.unique.user_name(),
-
-                email=fake.email(),
-                password='password123'
-            )
-            users.append(user)
-            if i % 1000 == 0:
-                self.stdout.write(f'Created {i} users')
-        self.stdout.write(f'Created {ratio} users')
-
-        User.objects.bulk_create(users)
-        Profile.objects.bulk_create([Profile(user=user) for user in users])
-        fake.unique.clear()
-
-        # Заполнение тегов
-        tags = []
-        generated_names = set()
-        for i in range(ratio):
-
-            while True:
-                name = '-'.join(fake.words(nb=2))
-                if len(name) <= 30 and name not in generated_names:
-                    generated_names.add(name)
-                    break
-            tag = Tag(
-                name=name,
-                color=random.choice(["pri", "sec", "suc", "dan", "war", "inf", "lig", "dar"])
-            )
-            tags.append(tag)
-            if i % 1000 == 0:
-                self.stdout.write(f'Created {i} tags')
-        self.stdout.write(f'Created {ratio} tags')
-
-        Tag.objects.bulk_create(tags)
-        fake.unique.clear()
-
-        # Заполнение вопросов
-        questions = []
-        for i in range(ratio * 10):
-            question = Question(
-                title=fake.sentence()[:-1] + '?',
-                text=fake.text(),
-                author=random.choice(users)
-            )
-            questions.append(question)
-            if i % 10000 == 0:
-                self.stdout.write(f'Created {i} questions')
-        self.stdout.write(f'Created {ratio * 10} questions')
-
-        Question.objects.bulk_create(questions)
-        
-        # Добавляем теги к вопросам
-        tag_ids = list(Tag.objects.values_list('id', flat=True))
-        for question in questions:
-            question.tags.set(random.sample(tag_ids, min(3, len(tag_ids))))
-
-        # Заполнение ответов
-        answers = []
-        question_ids = list(Question.objects.values_list('id', flat=True))
-        for i in range(ratio * 100):
-            answer = Answer(
-                text=fake.text(),
-                question_id=random.choice(question_ids),
-                author=random.choice(users)
-            )
-            answers.append(answer)
-            if i % 100000 == 0:
-                self.stdout.write(f'Created {i} answers')
-        self.stdout.write(f'Created {ratio * 100} answers')
-        Answer.objects.bulk_create(answers)
-
-        # Заполнение лайков к вопросам
-        question_likes = []
-        existed_question_pairs = set() 
-        for i in range(ratio * 200):
-            while True:
-                question = random.choice(questions)
-                user = random.choice(users)
-                pair = (question.id, user.id)
-                if pair not in existed_question_pairs:
-                    existed_question_pairs.add(pair)
-                    break
-            
-            question_likes.append(QuestionLike(
-                question=question,
-                user=user,
-                value=random.choice([1, -1])
-            ))
-            if i % 100000 == 0:
-                self.stdout.write(f'Created {i}|{ratio * 200} question likes')
-        self.stdout.write(f'Created {ratio * 200}|{ratio * 200} question likes')
-        QuestionLike.objects.bulk_create(question_likes)
-
-        # Заполнение лайков к ответам
-        answer_likes = []
-        existed_answer_pairs = set() 
-        for i in range(ratio * 200):
-            while True:
-                answer=random.choice(answers)
-                user=random.choice(users)
-                pair = (answer.id, user.id)
-                value=random.choice([1, -1])
-                if pair not in existed_answer_pairs:
-                    existed_answer_pairs.add(pair)
-                    break
-            
-            answer_likes.append(AnswerLike(
-                answer=answer,
-                user=user,
-                value=value,
-            ))
-            if i % 100000 == 0:
-                self.stdout.write(f'Created {i}|{ratio * 200} answer likes')
-        self.stdout.write(f'Created {ratio * 200}|{ratio * 200} answer likes')
-        AnswerLike.objects.bulk_create(answer_likes)
+        self.batch_size = kwargs['batch_size']
+        self.workers = kwargs['workers']
+        self.use_copy = kwargs['copy'] and connection.vendor == 'postgresql'
+        if kwargs['copy'] and not self.use_copy:
+            self.stdout.write(self.style.WARNING('COPY is only supported on PostgreSQL, using bulk_create'))
+
+        seed = kwargs['seed'] if kwargs['seed'] is not None else random.randrange(2 ** 32)
+        self.rnd = random.Random(seed)
+        fake = Faker()
+        fake.seed_instance(seed)
+
+        sentences = [fake.sentence() for _ in range(SENTENCE_POOL_SIZE)]
+        words = sorted({word for word in fake.get_words_list() if word.isalpha() and len(word) <= 14})
+
+        user_ids = self.fill_users(ratio, fake)
+        tag_ids = self.fill_tags(ratio, words)
+        question_ids = self.fill_questions(ratio * 10, seed, sentences, user_ids)
+        self.fill_question_tags(question_ids, tag_ids)
+        answer_ids = self.fill_answers(ratio * 100, seed, sentences, user_ids, question_ids)
+        self.fill_likes(QuestionLike, 'question_id', question_ids, user_ids, ratio * 200)
+        self.fill_likes(AnswerLike, 'answer_id', answer_ids, user_ids, ratio * 200)
+
+        # Вставки в обход save(), поэтому счетчики пересчитываются отдельно
+        call_command('rebuild_counters', stdout=self.stdout)
 
         self.stdout.write(self.style.SUCCESS(f'Successfully filled database with ratio {ratio}'))
         self.stdout.write(self.style.SUCCESS('\nActual database counts:'))
@@ -144,4 +86,162 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'- Questions: {Question.objects.count()}'))
         self.stdout.write(self.style.SUCCESS(f'- Answers: {Answer.objects.count()}'))
         self.stdout.write(self.style.SUCCESS(f'- QuestionLikes: {QuestionLike.objects.count()}'))
-        self.stdout.write(self.style.SUCCESS(f'- AnswerLikes: {AnswerLike.objects.count()}'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'- AnswerLikes: {AnswerLike.objects.count()}'))
+
+    # Вставка
+
+    def insert(self, model, fields, rows):
+        # Строки вставляются кортежами: bulk_create тратит большую часть времени
+        # на создание экземпляров моделей и компиляцию SQL. Поля, которых нет
+        # в fields, получают значения по умолчанию (auto_now - текущее время)
+        names = list(fields)
+        constants = []
+        now = timezone.now()
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.attname in names:
+                continue
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                value = now
+            else:
+                value = field.get_default()
+            names.append(field.attname)
+            constants.append(field.get_db_prep_save(value, connection))
+        constants = tuple(constants)
+        rows = [tuple(row) + constants for row in rows]
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in names)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if self.use_copy:
+                self.copy(cursor, f'COPY {table} ({columns}) FROM STDIN', rows)
+                return
+            placeholders = ', '.join(['%s'] * len(names))
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+
+    def copy(self, cursor, sql, rows):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(
+                '\\N' if value is None else
+                str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+                for value in row
+            ) + '\n')
+        buffer.seek(0)
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    def new_ids(self, model, last_id):
+        return list(model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True))
+
+    def last_id(self, model):
+        return model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def generate(self, func, total, seed, context):
+        # Генерация пачек строк - в пуле процессов или в текущем процессе
+        tasks = chunk_tasks(total, self.batch_size, seed)
+        if self.workers > 1:
+            with Pool(self.workers, initializer=init_worker, initargs=(context,)) as pool:
+                yield from pool.imap(func, tasks)
+        else:
+            init_worker(context)
+            for task in tasks:
+                yield func(task)
+
+    # Таблицы
+
+    def fill_users(self, count, fake):
+        # Один хэш на всех: make_password на каждого пользователя занял бы минуты
+        password = make_password('password123')
+        last_id = self.last_id(User)
+        suffix = last_id + 1
+        for start in range(0, count, self.batch_size):
+            users = [
+                (f'{fake.user_name()[:20]}{suffix + i}', fake.email(), password)
+                for i in range(start, min(start + self.batch_size, count))
+            ]
+            self.insert(User, ['username', 'email', 'password'], users)
+            self.stdout.write(f'Created {start + len(users)}|{count} users')
+
+        user_ids = self.new_ids(User, last_id)
+        for start in range(0, len(user_ids), self.batch_size):
+            self.insert(Profile, ['user_id'], [(user_id,) for user_id in user_ids[start:start + self.batch_size]])
+        return user_ids
+
+    def fill_tags(self, count, words):
+        existing = set(Tag.objects.values_list('name', flat=True))
+        # Уникальные пары слов выбираются без повторов прямо из пространства индексов
+        pairs = self.rnd.sample(range(len(words) ** 2), min(count + len(existing), len(words) ** 2))
+        names = []
+        for index in pairs:
+            name = f'{words[index // len(words)]}-{words[index % len(words)]}'
+            if name not in existing:
+                names.append(name)
+            if len(names) == count:
+                break
+        for i in range(len(names), count):
+            names.append(f'tag-{len(existing) + i}')
+
+        last_id = self.last_id(Tag)
+        for start in range(0, count, self.batch_size):
+            self.insert(Tag, ['name', 'color'], [
+                (name, self.rnd.choice(TAG_COLORS)) for name in names[start:start + self.batch_size]
+            ])
+        self.stdout.write(f'Created {count} tags')
+        return self.new_ids(Tag, last_id)
+
+    def fill_questions(self, count, seed, sentences, user_ids):
+        last_id = self.last_id(Question)
+        created = 0
+        context = {'sentences': sentences, 'user_ids': user_ids}
+        for rows in self.generate(question_rows, count, seed, context):
+            self.insert(Question, ['title', 'text', 'author_id'], rows)
+            created += len(rows)
+            self.stdout.write(f'Created {created}|{count} questions')
+        return self.new_ids(Question, last_id)
+
+    def fill_question_tags(self, question_ids, tag_ids):
+        # Связи M2M пишутся напрямую в through-таблицу, без tags.set() на каждый вопрос
+        Through = Question.tags.through
+        per_question = min(3, len(tag_ids))
+        for start in range(0, len(question_ids), self.batch_size):
+            rows = [
+                (question_id, tag_id)
+                for question_id in question_ids[start:start + self.batch_size]
+                for tag_id in self.rnd.sample(tag_ids, per_question)
+            ]
+            self.insert(Through, ['question_id', 'tag_id'], rows)
+        self.stdout.write(f'Tagged {len(question_ids)} questions')
+
+    def fill_answers(self, count, seed, sentences, user_ids, question_ids):
+        last_id = self.last_id(Answer)
+        created = 0
+        context = {'sentences': sentences, 'user_ids': user_ids, 'question_ids': question_ids}
+        for rows in self.generate(answer_rows, count, seed + 1, context):
+            self.insert(Answer, ['text', 'question_id', 'author_id'], rows)
+            created += len(rows)
+            self.stdout.write(f'Created {created}|{count} answers')
+        return self.new_ids(Answer, last_id)
+
+    def fill_likes(self, model, target_field, target_ids, user_ids, count):
+        # Пары (объект, пользователь) уникальны по построению: для каждого объекта
+        # пользователи выбираются через sample() без повторов, без цикла с перебором
+        counts = spread_votes(len(target_ids), count, len(user_ids), self.rnd, self.batch_size)
+        batch = []
+        created = 0
+        fields = [target_field, 'user_id', 'value']
+        for target_id, votes in zip(target_ids, counts):
+            for user_id in self.rnd.sample(user_ids, votes):
+                batch.append((target_id, user_id, self.rnd.choice((1, -1))))
+            if len(batch) >= self.batch_size:
+                self.insert(model, fields, batch)
+                created += len(batch)
+                batch = []
+                self.stdout.write(f'Created {created}|{count} {model._meta.verbose_name_plural}')
+        if batch:
+            self.insert(model, fields, batch)
+            created += len(batch)
+        self.stdout.write(f'Created {created}|{count} {model._meta.verbose_name_plural}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.cards import bump_listings
+from app.models import Answer, Question, Tag
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalized like, rating, answer and tag counters from the source tables'
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            questions = Question.objects.rebuild_counters()
+            self.stdout.write(f'Rebuilt counters for {questions} questions')
+            scores = Question.objects.refresh_hot_scores()
+            self.stdout.write(f'Updated hot score for {scores} questions')
+            answers = Answer.objects.rebuild_counters()
+            self.stdout.write(f'Rebuilt counters for {answers} answers')
+            tags = Tag.objects.rebuild_counters()
+            self.stdout.write(f'Rebuilt counters for {tags} tags')
+
+        bump_listings()
+
+        self.stdout.write(self.style.SUCCESS('Counters are up to date'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from app.cards import bump_listings
+from app.models import Tag
+
+class Command(BaseCommand):
+    help = 'Recount questions per tag and refresh the cached popular tags sidebar (run from cron)'
+
+    def handle(self, *args, **kwargs):
+        updated = Tag.objects.rebuild_counters()
+        bump_listings()
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} tags, popular tags cache refreshed'))
@@ -0,0 +1,49 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from app.models import Task
+from app.tasks import Worker, start_workers
+
+# Как часто главный поток удаляет старые выполненные задачи (в секундах)
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Run background task workers (threads); start several commands for several processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--once', action='store_true',
+            help='Run the tasks that are due now and exit (for cron and tests)')
+
+    def handle(self, *args, **kwargs):
+        # Задачи сбрасывают кэш (список популярных тегов, listing_version), а
+        # LocMemCache у каждого процесса свой: веб-процессы этого сброса не увидят
+        if isinstance(caches['default'], LocMemCache):
+            raise CommandError('Task workers need a cache shared with the web processes, not LocMemCache')
+        if kwargs['once']:
+            done = Worker().run_once()
+            self.stdout.write(self.style.SUCCESS(f'Ran {done} tasks'))
+            return
+
+        stop = threading.Event()
+        threads = start_workers(kwargs['threads'], stop)
+        self.stdout.write(f'Started {len(threads)} task workers, press Ctrl+C to stop')
+        try:
+            while True:
+                purged = Task.objects.purge_finished(
+                    timezone.now() - timedelta(days=settings.TASK_KEEP_FINISHED_DAYS)
+                )
+                if purged:
+                    self.stdout.write(f'Purged {purged} finished tasks')
+                stop.wait(PURGE_INTERVAL)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS('Task workers stopped'))
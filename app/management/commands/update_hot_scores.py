@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from app.cards import bump_listings
+from app.models import Question
+
+class Command(BaseCommand):
+    help = 'Recompute hot ranking scores (all questions or only recent ones)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+            help='Only questions created in the last N days')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        questions = Question.objects.all()
+        if kwargs['days'] is not None:
+            questions = questions.filter(created_at__gte=timezone.now() - timedelta(days=kwargs['days']))
+
+        updated = Question.objects.refresh_hot_scores(questions, batch_size=kwargs['batch_size'])
+        bump_listings()
+        self.stdout.write(self.style.SUCCESS(f'Updated hot score for {updated} questions'))
@@ -0,0 +1,88 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Question = apps.get_model('app', 'Question')
+    Answer = apps.get_model('app', 'Answer')
+    QuestionLike = apps.get_model('app', 'QuestionLike')
+    AnswerLike = apps.get_model('app', 'AnswerLike')
+
+    def counters(likes, fk):
+        return {
+            'like_count': Coalesce(Subquery(
+                likes.filter(value=1).values(fk).annotate(c=Count('id')).values('c')
+            ), 0),
+            'dislike_count': Coalesce(Subquery(
+                likes.filter(value=-1).values(fk).annotate(c=Count('id')).values('c')
+            ), 0),
+            'rating': Coalesce(Subquery(
+                likes.values(fk).annotate(s=Sum('value')).values('s')
+            ), 0),
+        }
+
+    answers = Answer.objects.filter(question=OuterRef('pk'))
+    Question.objects.update(
+        answer_count=Coalesce(Subquery(
+            answers.values('question').annotate(c=Count('id')).values('c')
+        ), 0),
+        **counters(QuestionLike.objects.filter(question=OuterRef('pk')), 'question'),
+    )
+    Answer.objects.update(
+        **counters(AnswerLike.objects.filter(answer=OuterRef('pk')), 'answer'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_tag_color'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='dislike_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='rating',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answer_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='dislike_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='rating',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-rating', '-created_at'], name='question_rating_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
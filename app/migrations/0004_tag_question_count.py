@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_question_count(apps, schema_editor):
+    Tag = apps.get_model('app', 'Tag')
+    Question = apps.get_model('app', 'Question')
+    through = Question.tags.through.objects.filter(tag=OuterRef('pk'))
+    Tag.objects.update(question_count=Coalesce(Subquery(
+        through.values('tag').annotate(c=Count('id')).values('c')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='question_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(fill_question_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+from app.ranking import hot_score
+
+
+def fill_hot_score(apps, schema_editor):
+    Question = apps.get_model('app', 'Question')
+    questions = list(Question.objects.only('id', 'rating', 'created_at'))
+    for question in questions:
+        question.hot_score = hot_score(question.rating, question.created_at)
+    Question.objects.bulk_update(questions, ['hot_score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_tag_question_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-hot_score', '-id'], name='question_hot_idx'),
+        ),
+        migrations.RunPython(fill_hot_score, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:25
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from app.search import install_search_index, uninstall_search_index
+
+
+def install(apps, schema_editor):
+    install_search_index(schema_editor.connection, rebuild=True)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_question_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install, uninstall),
+    ]
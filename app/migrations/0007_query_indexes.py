@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_question_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_rating_idx',
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', '-rating', '-created_at', '-id'], name='answer_question_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('is_correct', True)), fields=['question'], name='answer_correct_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answerlike',
+            index=models.Index(fields=['answer', 'value'], name='answerlike_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-created_at', '-id'], name='question_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionlike',
+            index=models.Index(fields=['question', 'value'], name='questionlike_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-question_count', 'id'], name='tag_popular_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_hash',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
@@ -1,20 +1,143 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.storage import default_storage
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models import Q, Count, Sum
+from django.db.models import F, Count, Sum, Value
 from django.db.models.functions import Coalesce
+from django.utils import timezone
+from app.avatars import thumbnail_name
+from app.cards import bump_question_card
+from app.ranking import hot_score
+from app.search import search_questions
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    # Хэш содержимого аватара, по нему называются миниатюры (app/avatars.py)
+    avatar_hash = models.CharField(max_length=16, blank=True, default='')
 
     def __str__(self):
         return self.user.username
 
+    def thumbnail_url(self, size, ext):
+        if not self.avatar_hash:
+            return ''
+        return default_storage.url(thumbnail_name(self.avatar_hash, size, ext))
+
+    @property
+    def avatar_64(self):
+        return self.thumbnail_url(64, 'jpg')
+
+    @property
+    def avatar_64_webp(self):
+        return self.thumbnail_url(64, 'webp')
+
+    @property
+    def avatar_128(self):
+        return self.thumbnail_url(128, 'jpg')
+
+    @property
+    def avatar_128_webp(self):
+        return self.thumbnail_url(128, 'webp')
+
+POPULAR_TAGS_CACHE_KEY = 'popular_tags'
+POPULAR_TAGS_LIMIT = 10
+
 class TagManager(models.Manager):
-    def popular(self, limit=10):
-        return self.annotate(
-            num_questions=Count('question')
-        ).order_by('-num_questions')[:limit]
+    def popular(self, limit=POPULAR_TAGS_LIMIT):
+        return self.order_by('-question_count', 'id')[:limit]
+
+    def cached_popular(self):
+        tags = cache.get(POPULAR_TAGS_CACHE_KEY)
+        if tags is None:
+            tags = self.refresh_popular()
+        return tags
+
+    def refresh_popular(self):
+        tags = list(self.popular())
+        cache.set(POPULAR_TAGS_CACHE_KEY, tags, settings.POPULAR_TAGS_TIMEOUT)
+        # Сбрасываем и отрендеренный сайдбар из base.html
+        cache.delete(make_template_fragment_key('popular_tags'))
+        return tags
+
+    def questions_added(self, tags):
+        # Инкрементальное обновление счетчиков после привязки тегов к новому вопросу
+        tag_ids = [tag.pk for tag in tags]
+        self.filter(pk__in=tag_ids).update(question_count=F('question_count') + 1)
+
+        popular = cache.get(POPULAR_TAGS_CACHE_KEY)
+        if popular is None:
+            return
+        # Список пересчитывается, только если новый вопрос мог изменить топ
+        threshold = popular[-1].question_count if len(popular) == POPULAR_TAGS_LIMIT else -1
+        popular_ids = {tag.pk for tag in popular}
+        for tag in tags:
+            if tag.pk in popular_ids or tag.question_count + 1 >= threshold:
+                self.refresh_popular()
+                return
+
+    def resolve(self, names):
+        # Теги по именам в исходном порядке: существующие - одним запросом, недостающие -
+        # одним INSERT. ignore_conflicts не падает, если тот же тег параллельно
+        # создает другой запрос, но и не возвращает pk, поэтому созданные перечитываются
+        names = list(dict.fromkeys(names))
+        tags = {tag.name: tag for tag in self.filter(name__in=names)}
+        missing = [name for name in names if name not in tags]
+        if missing:
+            self.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+            tags.update((tag.name, tag) for tag in self.filter(name__in=missing))
+        return [tags[name] for name in names]
+
+    def attach(self, question, tags):
+        # Привязка тегов к новому вопросу одним INSERT в through-таблицу.
+        # Счетчики обновляет questions_added (в views.ask - фоновой задачей)
+        Through = Question.tags.through
+        Through.objects.bulk_create(
+            [Through(question_id=question.pk, tag_id=tag.pk) for tag in tags],
+            ignore_conflicts=True,
+        )
+
+    def bulk_tag(self, question_tag_names, batch_size=1000):
+        # Для импорта: пары (вопрос или его id, список имен тегов). Все имена
+        # разрешаются за раз, связи пишутся пачками, счетчики пересчитываются
+        # только у затронутых тегов, карточки вопросов и списки сбрасываются
+        Through = Question.tags.through
+        pairs = [
+            (getattr(question, 'pk', question), names) for question, names in question_tag_names
+        ]
+        question_ids = {question_id for question_id, names in pairs if names}
+        with transaction.atomic():
+            tags = {tag.name: tag for tag in self.resolve(name for _, names in pairs for name in names)}
+            Through.objects.bulk_create(
+                [
+                    Through(question_id=question_id, tag_id=tags[name].pk)
+                    for question_id, names in pairs
+                    for name in dict.fromkeys(names)
+                ],
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            self.recount(self.filter(pk__in=[tag.pk for tag in tags.values()]))
+            if question_ids:
+                transaction.on_commit(lambda: bump_question_card(*question_ids))
+        self.refresh_popular()
+        return list(tags.values())
+
+    def recount(self, queryset):
+        through = Question.tags.through.objects.filter(tag=models.OuterRef('pk'))
+        return queryset.update(question_count=Coalesce(models.Subquery(
+            through.values('tag').annotate(c=Count('id')).values('c')
+        ), 0))
+
+    def rebuild_counters(self):
+        updated = self.recount(self.all())
+        self.refresh_popular()
+        return updated
     
 class Tag(models.Model):
     COLOR_CHOICES = [
@@ -30,9 +153,15 @@ class Tag(models.Model):
 
     name = models.CharField(max_length=30, unique=True)
     color = models.CharField(max_length=3, choices=COLOR_CHOICES, default="pri")
+    question_count = models.PositiveIntegerField(default=0)
 
     objects = TagManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-question_count', 'id'], name='tag_popular_idx'),
+        ]
+
     @property
     def get_color(self):
         return dict(self.COLOR_CHOICES).get(self.color, "primary")
@@ -40,21 +169,71 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
     
-class QuestionManager(models.Manager):
+class QuestionQuerySet(models.QuerySet):
+    def listing(self):
+        # Все, что нужно карточке вопроса, без запросов на каждую карточку
+        # Теги подгружаются в app.cards только для карточек, которых нет в кэше
+        return self.select_related('author__profile').defer('search_vector')
+
+    def search(self, query):
+        return search_questions(self, query)
+
+class QuestionManager(models.Manager.from_queryset(QuestionQuerySet)):
     def new(self):
-        return self.order_by('-created_at')
+        return self.order_by('-created_at', '-id')
 
     def hot(self):
-        return self.with_ratings().order_by('-rating', '-created_at')
+        return self.order_by('-hot_score', '-id')
 
-    def by_tag(self, tag_name):
-        return self.filter(tags__name=tag_name).order_by('-created_at')
-    
-    def with_ratings(self):
-        return self.annotate(
-            like_count=Count('questionlike', filter=Q(questionlike__value=1)),
-            dislike_count=Count('questionlike', filter=Q(questionlike__value=-1)),
-            rating=Coalesce(Sum('questionlike__value'), 0)
+    def by_tag(self, tag):
+        return self.filter(tags=tag).order_by('-created_at', '-id')
+
+    def apply_vote_deltas(self, question_id, like_delta, dislike_delta):
+        self.filter(pk=question_id).update(
+            like_count=F('like_count') + like_delta,
+            dislike_count=F('dislike_count') + dislike_delta,
+            rating=F('rating') + like_delta - dislike_delta,
+        )
+
+    def refresh_hot_scores(self, queryset=None, batch_size=1000):
+        # Пересчет hot_score пачками, без загрузки всей таблицы в память
+        queryset = self.all() if queryset is None else queryset
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_id).order_by('pk')
+                .only('id', 'rating', 'created_at', 'hot_score')[:batch_size]
+            )
+            if not batch:
+                return updated
+            changed = []
+            for question in batch:
+                score = hot_score(question.rating, question.created_at)
+                if score != question.hot_score:
+                    question.hot_score = score
+                    changed.append(question)
+            self.bulk_update(changed, ['hot_score'])
+            updated += len(changed)
+            last_id = batch[-1].pk
+
+    def rebuild_counters(self):
+        # Пересчет денормализованных счетчиков по таблицам лайков и ответов
+        likes = QuestionLike.objects.filter(question=models.OuterRef('pk'))
+        answers = Answer.objects.filter(question=models.OuterRef('pk'))
+        return self.update(
+            like_count=Coalesce(models.Subquery(
+                likes.filter(value=1).values('question').annotate(c=Count('id')).values('c')
+            ), 0),
+            dislike_count=Coalesce(models.Subquery(
+                likes.filter(value=-1).values('question').annotate(c=Count('id')).values('c')
+            ), 0),
+            rating=Coalesce(models.Subquery(
+                likes.values('question').annotate(s=Sum('value')).values('s')
+            ), 0),
+            answer_count=Coalesce(models.Subquery(
+                answers.values('question').annotate(c=Count('id')).values('c')
+            ), 0),
         )
 
 class Question(models.Model):
@@ -65,76 +244,232 @@ class Question(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Денормализованные счетчики, обновляются через F-выражения
+    like_count = models.PositiveIntegerField(default=0)
+    dislike_count = models.PositiveIntegerField(default=0)
+    rating = models.IntegerField(default=0)
+    answer_count = models.PositiveIntegerField(default=0)
+    hot_score = models.FloatField(default=0)
+    # Заполняется триггером PostgreSQL, см. app/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
     objects = QuestionManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='question_new_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='question_hot_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
     def get_url(self):
         return f'/question/{self.id}'
 
-    def answers_count(self):
-        return self.answer_set.count()
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.hot_score = hot_score(self.rating, self.created_at or timezone.now())
+        super().save(*args, **kwargs)
 
-    def likes_count(self):
-        return self.questionlike_set.filter(value=1).count()
-    
-    def dislikes_count(self):
-        return self.questionlike_set.filter(value=-1).count()
-    
-class QuestionManager(models.Manager):
-    def with_ratings(self):
-        return self.annotate(
-            like_count=Count('questionlike', filter=Q(questionlike__value=1)),
-            dislike_count=Count('questionlike', filter=Q(questionlike__value=-1)),
-            rating=Coalesce(Sum('questionlike__value'), 0)
+class VoteManager(models.Manager):
+    # Имя FK на оцениваемый объект, задается в наследниках
+    target_field = None
+
+    def vote_deltas(self, old_value, new_value):
+        like_delta = (new_value == 1) - (old_value == 1)
+        dislike_delta = (new_value == -1) - (old_value == -1)
+        return like_delta, dislike_delta
+
+    def for_user(self, user, target_ids):
+        # Голоса пользователя за объекты страницы строками (тип, id, значение).
+        # Тип нужен, чтобы объединить вопросы и ответы в один запрос через union()
+        field = f'{self.target_field}_id'
+        return self.filter(user=user, **{f'{field}__in': target_ids}).values_list(
+            Value(self.target_field, output_field=models.CharField()), field, 'value'
         )
 
+    async def atoggle(self, target_id, user, value):
+        # Повторный голос с тем же значением снимает его, противоположный - меняет.
+        # Возвращает изменения счетчиков (like_delta, dislike_delta); сами счетчики
+        # объекта не трогает, их записывает app.votes.coalescer
+        like, created = await self.aget_or_create(
+            user=user,
+            defaults={'value': value},
+            **{f'{self.target_field}_id': target_id}
+        )
+        if created:
+            return self.vote_deltas(None, value)
+
+        if like.value == value:
+            deleted, _ = await self.filter(pk=like.pk, value=value).adelete()
+            if deleted:
+                return self.vote_deltas(value, None)
+        elif await self.filter(pk=like.pk, value=like.value).aupdate(value=value):
+            return self.vote_deltas(like.value, value)
+        return 0, 0
+
+
+class QuestionLikeManager(VoteManager):
+    target_field = 'question'
+
+
 class QuestionLike(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     value = models.SmallIntegerField(choices=[(1, 'Like'), (-1, 'Dislike')])
 
+    objects = QuestionLikeManager()
+
     class Meta:
         unique_together = ('question', 'user')
+        indexes = [
+            models.Index(fields=['question', 'value'], name='questionlike_value_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} likes {self.question.title}"
 
     
-class AnswerManager(models.Manager):
-    def with_ratings(self):
-        return self.annotate(
-            like_count=Count('answerlike', filter=Q(answerlike__value=1)),
-            dislike_count=Count('answerlike', filter=Q(answerlike__value=-1)),
-            rating=Coalesce(Sum('answerlike__value'), 0)
+class AnswerQuerySet(models.QuerySet):
+    def listing(self):
+        return self.select_related('author__profile')
+
+class AnswerManager(models.Manager.from_queryset(AnswerQuerySet)):
+    def for_question(self, question):
+        return self.filter(question=question).order_by('-rating', '-created_at', '-id')
+
+    def apply_vote_deltas(self, answer_id, like_delta, dislike_delta):
+        self.filter(pk=answer_id).update(
+            like_count=F('like_count') + like_delta,
+            dislike_count=F('dislike_count') + dislike_delta,
+            rating=F('rating') + like_delta - dislike_delta,
         )
-    
+
+    def rebuild_counters(self):
+        likes = AnswerLike.objects.filter(answer=models.OuterRef('pk'))
+        return self.update(
+            like_count=Coalesce(models.Subquery(
+                likes.filter(value=1).values('answer').annotate(c=Count('id')).values('c')
+            ), 0),
+            dislike_count=Coalesce(models.Subquery(
+                likes.filter(value=-1).values('answer').annotate(c=Count('id')).values('c')
+            ), 0),
+            rating=Coalesce(models.Subquery(
+                likes.values('answer').annotate(s=Sum('value')).values('s')
+            ), 0),
+        )
+
 class Answer(models.Model):
     text = models.TextField(max_length=2000)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     is_correct = models.BooleanField(default=False)
+
+    like_count = models.PositiveIntegerField(default=0)
+    dislike_count = models.PositiveIntegerField(default=0)
+    rating = models.IntegerField(default=0)
     
     objects = AnswerManager()
 
+    class Meta:
+        indexes = [
+            # Страница ответов: WHERE question_id ORDER BY rating, created_at, id
+            models.Index(fields=['question', '-rating', '-created_at', '-id'], name='answer_question_rating_idx'),
+            # Текущий правильный ответ вопроса, их единицы на вопрос
+            models.Index(fields=['question'], condition=models.Q(is_correct=True), name='answer_correct_idx'),
+        ]
+
     def __str__(self):
         return f"Answer to {self.question.title}"
 
-    def likes_count(self):
-        return self.answerlike_set.filter(value=1).count()
-    
-    def dislikes_count(self):
-        return self.answerlike_set.filter(value=-1).count()
-    
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                Question.objects.filter(pk=self.question_id).update(
+                    answer_count=F('answer_count') + 1
+                )
+
+
+class AnswerLikeManager(VoteManager):
+    target_field = 'answer'
+
+
 class AnswerLike(models.Model):
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     value = models.SmallIntegerField(choices=[(1, 'Like'), (-1, 'Dislike')])
 
+    objects = AnswerLikeManager()
+
     class Meta:
         unique_together = ('answer', 'user')
+        indexes = [
+            models.Index(fields=['answer', 'value'], name='answerlike_value_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} likes answer #{self.answer.id}"
+
+class TaskManager(models.Manager):
+    def enqueue(self, name, payload, key=None, delay=0):
+        # Повторная постановка с тем же key ничего не делает: ON CONFLICT DO NOTHING
+        # по уникальному ключу, без исключения и без отката транзакции вызывающего
+        self.bulk_create([Task(
+            name=name,
+            payload=payload,
+            key=key,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            max_attempts=settings.TASK_MAX_ATTEMPTS,
+        )], ignore_conflicts=True)
+
+    def available(self, now):
+        # Ожидающие задачи, время которых пришло, и выполняемые, чей воркер
+        # не уложился в аренду (упал или завис)
+        return self.filter(
+            models.Q(status=Task.PENDING, run_at__lte=now)
+            | models.Q(status=Task.RUNNING, locked_until__lt=now)
+        )
+
+    def purge_finished(self, before):
+        return self.filter(status__in=[Task.DONE, Task.FAILED], finished_at__lt=before).delete()[0]
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # Ключ идемпотентности: одна задача на событие, сколько бы раз ее ни ставили
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TaskManager()
+
+    class Meta:
+        indexes = [
+            # Выборка воркера: WHERE status ORDER BY run_at
+            models.Index(fields=['status', 'run_at'], name='task_queue_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} likes answer #{self.answer.id}"
\ No newline at end of file
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,77 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from app.cards import listing_version, object_versions
+
+# Кэш целых страниц для анонимных читателей. Запрос без cookie сессии получает
+# готовый ответ из кэша без единого запроса к базе. Ключ включает версию
+# содержимого (app/cards.py): списки - listing_version, страница вопроса - версию
+# thread, которая меняется с вопросом, его ответами и голосами за них. Поэтому
+# изменение сразу дает новую страницу, а старые записи просто истекают.
+# С cookie сессии страница всегда собирается заново: в ней форма ответа,
+# кнопки автора вопроса и шапка пользователя. Vary: Cookie не дает прокси
+# отдать анонимную копию вошедшему пользователю и наоборот
+
+
+def is_anonymous_request(request):
+    return request.method in ('GET', 'HEAD') and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def page_key(request, version):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'anonymous_page:{path}:{version}'
+
+
+def listing_page_version(request, create=True, **kwargs):
+    return listing_version()
+
+
+def question_page_version(request, question_id, create=True):
+    return object_versions('thread', [question_id], create=create)[question_id]
+
+
+def cache_anonymous(version_func):
+    # version_func(request, create, **kwargs) - версия содержимого страницы;
+    # с create=False отсутствующая версия - None, без записи в кэш
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_anonymous_request(request):
+                response = view(request, *args, **kwargs)
+                patch_vary_headers(response, ['Cookie'])
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+
+            version = version_func(request, create=False, **kwargs)
+            if version is not None:
+                cached = cache.get(page_key(request, version))
+                if cached is not None:
+                    return cached
+
+            response = view(request, *args, **kwargs)
+            patch_vary_headers(response, ['Cookie'])
+            if response.status_code != 200:
+                return response
+            if response.cookies:
+                # Например, csrftoken: такой ответ нельзя отдавать другим
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+
+            patch_cache_control(
+                response, public=True, max_age=settings.ANONYMOUS_PAGE_MAX_AGE,
+                s_maxage=settings.ANONYMOUS_PAGE_MAX_AGE,
+            )
+            if version is None:
+                # Версия появляется только после успешного ответа (вопрос существует).
+                # Сама страница не сохраняется: ее могли собрать до изменения,
+                # которое эту версию уже сменило
+                version_func(request, create=True, **kwargs)
+            else:
+                cache.set(page_key(request, version), response, settings.ANONYMOUS_PAGE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
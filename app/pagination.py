@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Keyset-пагинация: страница ищется по значениям ключа сортировки последней
+# (или первой) записи предыдущей страницы, а не через OFFSET. Поэтому нет
+# COUNT(*) и глубокая страница стоит столько же, сколько первая.
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Страница, которая начинается с самой записи-ключа: ссылка на только что
+# созданный объект без подсчета его позиции в списке
+AT = 'a'
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    def __init__(self, queryset, ordering, per_page=10, with_count=False):
+        # ordering - поля в стиле order_by(), последнее должно быть уникальным (обычно id)
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+        self.with_count = with_count
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-')) for name in ordering
+        ]
+
+    def encode(self, obj, direction):
+        values = [field.value_to_string(obj) for field in self.fields]
+        payload = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode(self, cursor):
+        # Невалидный курсор - это первая страница, как и неверный номер в paginate()
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(payload)
+            if direction not in (NEXT, PREVIOUS, AT) or len(values) != len(self.fields):
+                return None, None
+            return direction, [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None, None
+
+    def seek(self, key, reverse, inclusive=False):
+        # Лексикографическое "строго после key" (или "начиная с key") для набора полей
+        # с разными направлениями
+        conditions = []
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith('-') != reverse
+            lookup = f"{name.lstrip('-')}__{'lt' if descending else 'gt'}"
+            equal = {
+                prev.lstrip('-'): value for prev, value in zip(self.ordering[:i], key[:i])
+            }
+            conditions.append(Q(**equal, **{lookup: key[i]}))
+        if inclusive:
+            conditions.append(Q(**{name.lstrip('-'): value for name, value in zip(self.ordering, key)}))
+        return reduce(or_, conditions)
+
+    def reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def page(self, cursor=None):
+        direction, key = self.decode(cursor) if cursor else (None, None)
+        count = self.queryset.count() if self.with_count else None
+
+        if direction == PREVIOUS:
+            queryset = self.queryset.filter(self.seek(key, reverse=True))
+            rows = list(queryset.order_by(*self.reversed_ordering())[:self.per_page + 1])
+            if len(rows) <= self.per_page:
+                # Дошли до начала списка - отдаем обычную первую страницу
+                return self.page()
+            rows = rows[:self.per_page][::-1]
+            return CursorPage(
+                rows,
+                next_cursor=self.encode(rows[-1], NEXT),
+                previous_cursor=self.encode(rows[0], PREVIOUS),
+                count=count,
+            )
+
+        queryset = self.queryset
+        if direction in (NEXT, AT):
+            queryset = queryset.filter(self.seek(key, reverse=False, inclusive=direction == AT))
+        rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return CursorPage(
+            rows,
+            next_cursor=self.encode(rows[-1], NEXT) if has_more else None,
+            previous_cursor=self.encode(rows[0], PREVIOUS) if direction and rows else None,
+            count=count,
+        )
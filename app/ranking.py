@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from math import log10
+
+# Формула "hot" в стиле Reddit: порядок величины рейтинга плюс время публикации.
+# Каждые HOT_DECAY_SECONDS свежести стоят столько же, сколько десятикратный рост
+# рейтинга, поэтому старые вопросы постепенно уступают новым. Счет зависит только
+# от рейтинга и даты создания, так что его достаточно пересчитывать при голосовании.
+
+HOT_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HOT_DECAY_SECONDS = 45000
+
+def hot_score(rating, created_at):
+    order = log10(max(abs(rating), 1))
+    sign = 1 if rating > 0 else -1 if rating < 0 else 0
+    seconds = (created_at - HOT_EPOCH).total_seconds()
+    return round(sign * order + seconds / HOT_DECAY_SECONDS, 7)
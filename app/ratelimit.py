@@ -0,0 +1,96 @@
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+# Ограничение частоты записи (голоса, ответы, вопросы). Лимит "N/период" - это
+# корзина на N токенов, которая наполняется за период. Реализован как GCRA:
+# в кэше хранится одно число - момент, когда корзина снова будет полной (мс),
+# и каждый запрос атомарно прибавляет к нему интервал одного токена (incr).
+# Отказ - это два обращения к кэшу и ответ 429 без ORM: пользователь берется
+# из сессии в cookie, а не через request.user. Лимит считается на пользователя,
+# для анонимных - на IP. Пустой RATE_LIMITS (или scope без записи в нем)
+# выключает ограничение - так делает команда benchmark
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def client_key(request, scope):
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is not None:
+        return f'ratelimit:{scope}:user:{user_id}'
+    return f'ratelimit:{scope}:ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def take_token(key, rate):
+    # Возвращает 0, если токен есть, иначе через сколько секунд он появится
+    count, period = parse_rate(rate)
+    interval = period * 1000 // count
+    burst = period * 1000
+    now = int(time.time() * 1000)
+    timeout = period + 1
+
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        # Ключа нет - корзина полная
+        if cache.add(key, now + interval, timeout):
+            return 0
+        full_at = cache.incr(key, interval)
+
+    if full_at - interval < now:
+        # Корзина успела наполниться: отсчет идет от текущего момента.
+        # Гонка здесь возможна только у простаивающей корзины и дает не больше лишнего токена
+        cache.set(key, now + interval, timeout)
+        return 0
+    if full_at - now > burst:
+        # Отказ не расходует токен
+        cache.decr(key, interval)
+        return max(1, math.ceil((full_at - now - burst) / 1000))
+    # incr не продлевает срок ключа, а он должен дожить до наполнения корзины
+    cache.touch(key, timeout)
+    return 0
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse('Too many requests', status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(scope, methods=('POST',)):
+    # Лимит берется из settings.RATE_LIMITS[scope]; без записи там ограничения нет
+    def check(request):
+        rate = settings.RATE_LIMITS.get(scope)
+        if rate is None or request.method not in methods:
+            return None
+        retry_after = take_token(client_key(request, scope), rate)
+        return too_many_requests(retry_after) if retry_after else None
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                response = check(request)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return response
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                response = check(request)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return response
+        return wrapper
+    return decorator
@@ -0,0 +1,133 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Чтение с реплик. Реплика используется только для безопасных запросов (GET/HEAD),
+# которые пропустил ReplicaRoutingMiddleware; все остальное - POST, команды,
+# поток сброса голосов - читает и пишет в default. После записи пользователь
+# получает cookie, и REPLICA_PIN_SECONDS секунд его запросы читают из default,
+# чтобы свой ответ или голос был виден сразу, несмотря на задержку репликации.
+# Одна реплика выбирается на весь запрос, чтобы чтения внутри него были согласованы
+
+PIN_COOKIE = 'primary_until'
+
+# Запись определяется по выполненному SQL, а не по db_for_write: роутер
+# спрашивают и без записи (например, при присваивании связанного объекта)
+WRITE_STATEMENTS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'MERGE', 'CREATE', 'ALTER', 'DROP', 'TRUNCATE'}
+
+# Состояние текущего запроса - изменяемый объект, а не отдельные значения,
+# чтобы запись из sync_to_async (скопированный контекст) была видна и запросу
+_state = ContextVar('replica_state', default=None)
+
+
+class ReplicaState:
+    __slots__ = ('alias', 'wrote')
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.wrote or state.alias is None:
+            return DEFAULT_DB_ALIAS
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему и данные через репликацию
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def track_writes(execute, sql, params, many, context):
+    state = _state.get()
+    if state is not None and not state.wrote:
+        statement = sql.lstrip()[:10].split(None, 1)
+        if statement and statement[0].upper() in WRITE_STATEMENTS:
+            # Оставшиеся чтения этого запроса тоже идут в default
+            state.wrote = True
+    return execute(sql, params, many, context)
+
+
+def install_write_tracker(sender, connection, **kwargs):
+    # Обертка ставится на само соединение, а не на время запроса: так она видит
+    # и запросы из потоков sync_to_async, а состояние запроса берет из ContextVar
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+def is_pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def replica_reads(alias):
+    state = ReplicaState(alias)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def choose_replica(request):
+    replicas = settings.DATABASE_REPLICAS
+    if replicas and request.method in ('GET', 'HEAD', 'OPTIONS') and not is_pinned(request):
+        return random.choice(replicas)
+    return None
+
+
+def pin_primary(response):
+    pin_seconds = settings.REPLICA_PIN_SECONDS
+    response.set_cookie(
+        PIN_COOKIE, f'{time.time() + pin_seconds:.0f}', max_age=pin_seconds,
+        httponly=True, samesite='Lax',
+    )
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with replica_reads(choose_replica(request)) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            pin_primary(response)
+        return response
+
+    async def __acall__(self, request):
+        # Состояние видно и view в потоке sync_to_async: контекст копируется туда
+        with replica_reads(choose_replica(request)) as state:
+            response = await self.get_response(request)
+        if state.wrote:
+            pin_primary(response)
+        return response
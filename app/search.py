@@ -0,0 +1,127 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+# Полнотекстовый поиск по вопросам. Индекс поддерживается триггерами базы данных,
+# поэтому остается актуальным при любом INSERT/UPDATE, включая bulk_create:
+# - PostgreSQL: колонка tsvector (title с весом A, text с весом B) и GIN-индекс;
+# - SQLite: внешняя FTS5-таблица поверх app_question (для локальной разработки).
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'app_question_fts'
+
+POSTGRES_SQL = [
+    f"""
+    CREATE OR REPLACE FUNCTION app_question_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS app_question_search_vector_trigger ON app_question",
+    """
+    CREATE TRIGGER app_question_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, text ON app_question
+    FOR EACH ROW EXECUTE FUNCTION app_question_search_vector_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS app_question_search_idx ON app_question USING gin (search_vector)",
+]
+
+SQLITE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(title, text, content='app_question', content_rowid='id', tokenize='porter unicode61')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS app_question_fts_insert AFTER INSERT ON app_question BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS app_question_fts_delete AFTER DELETE ON app_question BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS app_question_fts_update AFTER UPDATE OF title, text ON app_question BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END
+    """,
+]
+
+def install_search_index(connection, rebuild=False):
+    # Идемпотентно: вызывается из миграции и после каждого migrate, потому что
+    # SQLite пересоздает таблицу при некоторых ALTER и теряет триггеры
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_SQL
+        if rebuild:
+            statements = statements + [
+                "UPDATE app_question SET title = title",
+            ]
+    elif connection.vendor == 'sqlite':
+        statements = SQLITE_SQL
+        if rebuild:
+            statements = statements + [
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+            ]
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+def uninstall_search_index(connection):
+    if connection.vendor == 'postgresql':
+        statements = [
+            "DROP TRIGGER IF EXISTS app_question_search_vector_trigger ON app_question",
+            "DROP FUNCTION IF EXISTS app_question_search_vector_update()",
+            "DROP INDEX IF EXISTS app_question_search_idx",
+        ]
+    elif connection.vendor == 'sqlite':
+        statements = [
+            "DROP TRIGGER IF EXISTS app_question_fts_insert",
+            "DROP TRIGGER IF EXISTS app_question_fts_delete",
+            "DROP TRIGGER IF EXISTS app_question_fts_update",
+            f"DROP TABLE IF EXISTS {FTS_TABLE}",
+        ]
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+def fts5_query(query):
+    # Каждое слово берется в кавычки, чтобы пользовательский ввод
+    # не интерпретировался как синтаксис FTS5
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"' for word in words)
+
+def search_questions(queryset, query):
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-id')
+
+    if vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset.none()
+        # bm25() тем меньше, чем лучше совпадение; заголовок весит больше текста
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        ).annotate(rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = app_question.id', (match,)
+        )).order_by('-rank', '-id')
+
+    return queryset.filter(Q(title__icontains=query) | Q(text__icontains=query)).order_by('-created_at', '-id')
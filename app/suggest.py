@@ -0,0 +1,73 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from app.models import Tag
+
+# Индекс префиксов для подсказки тегов. Имена тегов хранятся в памяти процесса
+# отсортированным списком, поиск по префиксу - это bisect и проход по диапазону,
+# без LIKE 'q%' в базе. Новые теги и счетчики вопросов views.ask добавляет
+# инкрементально (questions_added), а полная перезагрузка раз в
+# TAG_SUGGEST_REFRESH секунд подтягивает изменения других процессов
+
+SUGGEST_LIMIT = 10
+
+
+class TagIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.keys = []
+        self.tags = {}
+        self.loaded_at = None
+
+    def load(self):
+        tags = {name.lower(): [name, count] for name, count in Tag.objects.values_list('name', 'question_count')}
+        keys = sorted(tags)
+        with self.lock:
+            self.keys, self.tags = keys, tags
+            self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if self.loaded_at is None:
+            self.load()
+        elif time.monotonic() - self.loaded_at > settings.TAG_SUGGEST_REFRESH:
+            # Перезагружает один поток, остальные пока отвечают по старому индексу
+            if self.reload_lock.acquire(blocking=False):
+                try:
+                    self.load()
+                finally:
+                    self.reload_lock.release()
+
+    def questions_added(self, tags):
+        # Вызывается после привязки тегов к новому вопросу: новые имена вставляются
+        # в отсортированный список, у существующих растет счетчик
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            for tag in tags:
+                key = tag.name.lower()
+                entry = self.tags.get(key)
+                if entry is None:
+                    self.tags[key] = [tag.name, 1]
+                    insort(self.keys, key)
+                else:
+                    entry[1] += 1
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        self.ensure_loaded()
+        with self.lock:
+            start = bisect_left(self.keys, prefix)
+            # Все ключи с этим префиксом лежат подряд и меньше prefix + '\uffff'
+            end = bisect_left(self.keys, prefix + '\uffff', start)
+            matches = [self.tags[key] for key in self.keys[start:end]]
+        best = heapq.nsmallest(limit, matches, key=lambda entry: (-entry[1], entry[0]))
+        return [{'name': name, 'question_count': count} for name, count in best]
+
+
+tag_index = TagIndex()
@@ -0,0 +1,146 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from app.cards import bump_listings
+from app.models import Answer, Tag, Task
+
+# Фоновые задачи после записи. Задача - строка таблицы Task, которая вставляется
+# в той же транзакции, что и сама запись, поэтому не теряется и не выполняется
+# для откатившейся записи. Воркеры (команда run_worker, потоки или отдельные
+# процессы) забирают задачи условным UPDATE: его выигрывает ровно один воркер
+# на любой базе, без SELECT ... FOR UPDATE. Обработчик и отметка о выполнении
+# идут в одной транзакции: изменения в базе применяются ровно один раз, а внешние
+# действия (письма) - не меньше одного раза
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class LeaseLost(Exception):
+    # Аренда истекла и задачу забрал другой воркер - работа этого откатывается
+    pass
+
+
+def task(func):
+    TASKS[func.__name__] = func
+    return func
+
+
+def enqueue(func, key=None, delay=0, **payload):
+    # payload - аргументы обработчика, только то, что сериализуется в JSON (обычно id)
+    Task.objects.enqueue(func.__name__, payload, key=key, delay=delay)
+
+
+class Worker:
+    def __init__(self, batch_size=10):
+        self.batch_size = batch_size
+
+    def claim(self):
+        now = timezone.now()
+        candidates = (
+            Task.objects.available(now).order_by('run_at', 'id')
+            .values_list('id', 'attempts')[:self.batch_size]
+        )
+        for task_id, attempts in candidates:
+            claimed = Task.objects.available(now).filter(pk=task_id, attempts=attempts).update(
+                status=Task.RUNNING,
+                attempts=F('attempts') + 1,
+                locked_until=now + timedelta(seconds=settings.TASK_LEASE),
+            )
+            if claimed:
+                return Task.objects.get(pk=task_id)
+        return None
+
+    def execute(self, task):
+        # Фильтр по attempts - та самая аренда: после повторной выдачи он не совпадет
+        owned = Task.objects.filter(pk=task.pk, attempts=task.attempts, status=Task.RUNNING)
+        if task.attempts > task.max_attempts:
+            # Последняя попытка не завершилась (воркер упал), новых не будет
+            owned.update(status=Task.FAILED, finished_at=timezone.now(), locked_until=None)
+            return
+
+        try:
+            with transaction.atomic():
+                handler = TASKS.get(task.name)
+                if handler is None:
+                    raise LookupError(f'Unknown task {task.name}')
+                handler(**task.payload)
+                if not owned.update(status=Task.DONE, finished_at=timezone.now(), locked_until=None):
+                    raise LeaseLost(task.pk)
+        except LeaseLost:
+            logger.warning('Task %s lost its lease, result discarded', task)
+        except Exception:
+            logger.exception('Task %s failed (attempt %d of %d)', task, task.attempts, task.max_attempts)
+            error = traceback.format_exc()
+            if task.attempts >= task.max_attempts:
+                owned.update(status=Task.FAILED, last_error=error, finished_at=timezone.now(), locked_until=None)
+            else:
+                delay = settings.TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+                owned.update(
+                    status=Task.PENDING, last_error=error, locked_until=None,
+                    run_at=timezone.now() + timedelta(seconds=delay),
+                )
+
+    def run_once(self):
+        # Выполняет задачи, пока они есть; возвращает их количество
+        done = 0
+        while (task := self.claim()) is not None:
+            self.execute(task)
+            done += 1
+        return done
+
+    def run(self, stop, poll_interval):
+        try:
+            while not stop.is_set():
+                if not self.run_once():
+                    stop.wait(poll_interval)
+        finally:
+            connection.close()
+
+
+def start_workers(count, stop):
+    threads = []
+    for i in range(count):
+        thread = threading.Thread(
+            target=Worker().run, args=(stop, settings.TASK_POLL_INTERVAL), name=f'task-worker-{i}', daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+# Обработчики
+
+@task
+def count_question_tags(tag_ids):
+    # Счетчики вопросов у тегов нового вопроса и список популярных тегов.
+    # Строки популярных тегов обновляет каждый новый вопрос, поэтому эта запись
+    # вынесена из запроса views.ask
+    Tag.objects.questions_added(list(Tag.objects.filter(pk__in=tag_ids)))
+    # Версия после коммита: иначе страницу со старыми счетчиками могут сохранить под новой
+    transaction.on_commit(bump_listings)
+
+
+@task
+def notify_question_author(answer_id):
+    answer = Answer.objects.select_related('author', 'question__author').filter(pk=answer_id).first()
+    if answer is None:
+        return
+    question = answer.question
+    if not question.author.email or question.author_id == answer.author_id:
+        return
+    send_mail(
+        f'New answer to "{question.title}"',
+        f'{answer.author.username} answered your question:\n\n{answer.text}\n\n{question.get_url()}#answer-{answer.id}',
+        None,
+        [question.author.email],
+    )
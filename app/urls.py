@@ -1,13 +1,16 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path
-from app import views
+from app import api, views
 
 urlpatterns = [
     path('', views.index, name="index"),
     path('hot', views.hot, name="hot"),
     path('question/<int:question_id>', views.question, name="question"),
+    path('question/<int:question_id>/events', views.question_events, name="question_events"),
     path('tag/<slug:tag_name>', views.tag, name="tag"),
+    path('tags/suggest', views.tag_suggest, name="tag_suggest"),
+    path('search', views.search, name="search"),
     path('login', views.login, name="login"),
     path('signup', views.signup, name="signup"),
     path('ask', views.ask, name="ask"),
@@ -16,6 +19,12 @@ urlpatterns = [
     path('answer/<int:answer_id>/like', views.answer_like, name='answer_like'),
     path('question/<int:question_id>/like', views.question_like, name='question_like'),
     path('answer/<int:answer_id>/mark_correct/', views.mark_correct_answer, name='mark_correct'),
+    path('stats/requests', views.request_stats, name='request_stats'),
+    path('api/v1/questions', api.questions, name='api_questions'),
+    path('api/v1/questions/hot', api.hot_questions, name='api_hot_questions'),
+    path('api/v1/question/<int:question_id>', api.question, name='api_question'),
+    path('api/v1/tag/<slug:tag_name>', api.tag_questions, name='api_tag_questions'),
+    path('api/v1/tags', api.tags, name='api_tags'),
 ]
 
 if settings.DEBUG:  
@@ -1,19 +1,30 @@
+import asyncio
 import copy
 from multiprocessing import Value
 from profile import Profile
 
-from django.http import Http404, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from app import models
+from app import instrumentation, models
+from app.backends import invalidate_user
+from app.cards import bump_question_card, render_answer_cards, render_question_cards
 from app.context import setRightAnswerResponse
+from app.events import broker, events_enabled, publish_question_event, question_channel
+from app.pagecache import cache_anonymous, listing_page_version, question_page_version
+from app.pagination import AT, CursorPaginator
+from app.ratelimit import ratelimit
+from app.suggest import tag_index
+from app.tasks import count_question_tags, enqueue, notify_question_author
+from app.votes import coalescer
 from app.forms import AnswerForm, AskForm, LoginForm, UserEditForm, UserForm
 from app.models import Answer, AnswerLike, Question, QuestionLike, Tag
 from django.contrib import auth
+from django.db import transaction
 from django.urls import reverse, reverse_lazy
-from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count, Sum
-from django.db.models.functions import Coalesce
+from django.utils.http import urlencode
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.views.decorators.cache import cache_control
 from django.views.decorators.http import require_POST
 
 def paginate(object_list, request, per_page=10):
@@ -34,19 +45,61 @@ def paginate(object_list, request, per_page=10):
         page = paginator.page(1)
     return page
 
+def paginate_cursor(object_list, request, ordering, per_page=10):
+    paginator = CursorPaginator(object_list, ordering, per_page)
+    return paginator.page(request.GET.get('cursor'))
+
+def my_votes(request, questions=(), answers=()):
+    # Голоса текущего пользователя за карточки страницы одним запросом. Карточки
+    # общие для всех, поэтому состояние кнопок передается отдельно (json_script в base.html)
+    if not request.user.is_authenticated:
+        return None
+    votes = {'question': {}, 'answer': {}}
+    querysets = [
+        manager.for_user(request.user, [obj.pk for obj in objects])
+        for manager, objects in ((QuestionLike.objects, questions), (AnswerLike.objects, answers))
+        if objects
+    ]
+    if querysets:
+        rows = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+        for kind, object_id, value in rows:
+            votes[kind][object_id] = value
+    return votes
+
+QUESTIONS_NEW_ORDERING = ('-created_at', '-id')
+QUESTIONS_HOT_ORDERING = ('-hot_score', '-id')
+ANSWERS_ORDERING = ('-rating', '-created_at', '-id')
+
+# SSE: интервал комментария-пульса (с) и пауза перед переподключением браузера (мс)
+EVENTS_HEARTBEAT = 15
+EVENTS_RETRY_MS = 3000
+
 
 # Create your views here.
+@cache_anonymous(listing_page_version)
 def index(request):
-    questions = Question.objects.new()
-    page = paginate(questions, request)
+    questions = Question.objects.new().listing()
+    page = paginate_cursor(questions, request, QUESTIONS_NEW_ORDERING)
 
-    return render(request, 'index.html', context={'questions': page.object_list, 'page_obj': page})
+    questions = render_question_cards(page.object_list)
+    return render(request, 'index.html', context={
+        'questions': questions,
+        'page_obj': page,
+        'my_votes': my_votes(request, questions),
+    })
 
+@cache_anonymous(listing_page_version)
 def hot(request):
-    questions = Question.objects.with_ratings().order_by('-rating', '-created_at')
-    page = paginate(questions, request)
-    return render(request, 'hot.html', context={'questions': page.object_list, 'page_obj': page})
+    questions = Question.objects.hot().listing()
+    page = paginate_cursor(questions, request, QUESTIONS_HOT_ORDERING)
+    questions = render_question_cards(page.object_list)
+    return render(request, 'hot.html', context={
+        'questions': questions,
+        'page_obj': page,
+        'my_votes': my_votes(request, questions),
+    })
 
+@ratelimit('ask')
 def ask(request):
     if not request.user.is_authenticated:
         return redirect(reverse('login') + f'?continue={reverse("ask")}')
@@ -56,12 +109,13 @@ def ask(request):
         if form.is_valid():
             question = form.save(commit=False)
             question.author = request.user
-            question.save()
-
-            tag_names = form.cleaned_data['tags']
-            for name in tag_names:
-                tag, created = Tag.objects.get_or_create(name=name)
-                question.tags.add(tag)
+            with transaction.atomic():
+                question.save()
+                tags = Tag.objects.resolve(form.cleaned_data['tags'])
+                Tag.objects.attach(question, tags)
+                enqueue(count_question_tags, key=f'question_tags:{question.pk}', tag_ids=[tag.pk for tag in tags])
+            tag_index.questions_added(tags)
+            bump_question_card(question.id)
 
             return redirect(question.get_url())
     else:
@@ -69,10 +123,12 @@ def ask(request):
 
     return render(request, 'ask.html', {'form': form})
 
+@ratelimit('answer')
+@cache_anonymous(question_page_version)
 def question(request, question_id):
-    question = get_object_or_404(Question, pk=question_id)
-    answers = Answer.objects.with_ratings().filter(question=question).order_by('-rating', '-created_at')
-    page = paginate(answers, request)
+    question = get_object_or_404(Question.objects.listing(), pk=question_id)
+    answers = Answer.objects.for_question(question).listing()
+    paginator = CursorPaginator(answers, ANSWERS_ORDERING)
 
     if request.method == 'POST':
         form = AnswerForm(request.POST)
@@ -80,42 +136,103 @@ def question(request, question_id):
             answer = form.save(commit=False)
             answer.question = question
             answer.author = request.user
-            answer.save()
-
-            all_answers = Answer.objects.with_ratings().filter(question=question).order_by('-rating', '-created_at')
-            answer_ids = list(all_answers.values_list('id', flat=True))
-            
-            try:
-                answer_position = answer_ids.index(answer.id)
-                page_num = (answer_position // page.paginator.per_page) + 1
-                return redirect(f"{question.get_url()}?page={page_num}#answer-{answer.id}")
-            except ValueError:
-                # Если ошибка, то редирект на первую страницу
-                return redirect(f"{question.get_url()}#answer-{answer.id}")
+            with transaction.atomic():
+                answer.save()
+                enqueue(notify_question_author, key=f'answer_notification:{answer.pk}', answer_id=answer.pk)
+            bump_question_card(question.id)
+            publish_new_answer(question, answer)
+
+            # Страница, которая начинается с нового ответа: позиция в списке не считается
+            cursor = paginator.encode(answer, AT)
+            return redirect(f"{question.get_url()}?cursor={cursor}#answer-{answer.id}")
     else:
         form = AnswerForm()
 
+    page = paginator.page(request.GET.get('cursor'))
+    render_question_cards([question])
+    can_mark_correct = request.user.is_authenticated and question.author_id == request.user.id
+    answers = render_answer_cards(page.object_list, question, can_mark_correct)
     return render(request, 'single_question.html', context={
         'question': question,
-        'answers': page.object_list,
+        'answers': answers,
         'page_obj': page,
-        'form': form
+        'form': form,
+        'my_votes': my_votes(request, [question], answers),
+        'question_events': events_enabled(request),
+    })
+
+
+def publish_new_answer(question, answer):
+    # Карточка в варианте для читателей; автор вопроса увидит кнопку "Correct!" после перезагрузки.
+    # Счетчик ответов берется из загруженного вопроса, без повторного чтения
+    render_answer_cards([answer], question, can_mark_correct=False)
+    publish_question_event(question.id, 'answer', {
+        'id': answer.id,
+        'html': answer.card,
+        'answer_count': question.answer_count + 1,
     })
 
+async def question_events(request, question_id):
+    # SSE-поток страницы вопроса. Держит соединение открытым, поэтому
+    # рассчитан на ASGI (askme_voronin/asgi.py)
+    if not events_enabled(request):
+        # 204 - сигнал EventSource больше не переподключаться
+        return HttpResponse(status=204)
+    if not await Question.objects.filter(pk=question_id).aexists():
+        raise Http404
+
+    async def stream():
+        subscription = broker.subscribe(question_channel(question_id))
+        try:
+            yield f'retry: {EVENTS_RETRY_MS}\n\n'
+            while True:
+                try:
+                    yield await subscription.get(EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # Комментарий не дает прокси закрыть простаивающее соединение
+                    yield ': heartbeat\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
+
+@cache_anonymous(listing_page_version)
 def tag(request, tag_name):
     try:
         tag = Tag.objects.get(name=tag_name)
-        questions = Question.objects.by_tag(tag_name)
-        page = paginate(questions, request)
+        questions = Question.objects.by_tag(tag).listing()
+        page = paginate_cursor(questions, request, QUESTIONS_NEW_ORDERING)
+        questions = render_question_cards(page.object_list)
         return render(request, 'tag.html', {
-            'questions': page.object_list,
+            'questions': questions,
             'page_obj': page,
-            'tag': tag
+            'tag': tag,
+            'my_votes': my_votes(request, questions),
         })
     except Tag.DoesNotExist:
         raise Http404("Tag not found")
 
+@cache_control(max_age=60)
+def tag_suggest(request):
+    return JsonResponse({'tags': tag_index.suggest(request.GET.get('q', ''))})
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    questions = Question.objects.search(query).listing() if query else Question.objects.none()
+    page = paginate(questions, request)
+    questions = render_question_cards(page.object_list)
+    return render(request, 'search.html', {
+        'questions': questions,
+        'page_obj': page,
+        'my_votes': my_votes(request, questions),
+        'query': query,
+        'pagination_query': urlencode({'q': query}) + '&',
+    })
+
 def login(request):
     if request.user.is_authenticated:
         return redirect(reverse('edit'))
@@ -151,6 +268,7 @@ def signup(request):
     return render(request, 'signup.html', context={'form':form})
 
 def logout(request):
+    invalidate_user(request.user.pk)
     auth.logout(request)
     prev_url = request.META.get('HTTP_REFERER') # Получаем URL предыдущей страницы
 
@@ -165,64 +283,43 @@ def edit(request):
             form.save()
     return render(request, 'edit.html', context={'form':form})
 
+# AJAX
+
 @require_POST
+@ratelimit('vote')
 @login_required
-def question_like(request, question_id):
-    question = get_object_or_404(Question, pk=question_id)
-    value = 1 if request.POST.get('action') == 'like' else -1
-    
-    like, created = QuestionLike.objects.get_or_create(
-        question=question,
-        user=request.user,
-        defaults={'value': value}
-    )
-    
-    if not created:
-        if like.value == value:
-            like.delete()
-        else:
-            like.value = value
-            like.save()
-    
-    likes_count = QuestionLike.objects.filter(question=question, value=1).count()
-    dislikes_count = QuestionLike.objects.filter(question=question, value=-1).count()
-    
-    return JsonResponse({
-        'likes_count': likes_count,
-        'dislikes_count': dislikes_count
-    })
-
-# AJAX
+async def question_like(request, question_id):
+    return await vote(request, Question, QuestionLike, 'question', question_id)
 
 @require_POST
+@ratelimit('vote')
 @login_required
-def answer_like(request, answer_id):
-    answer = get_object_or_404(Answer, pk=answer_id)
+async def answer_like(request, answer_id):
+    return await vote(request, Answer, AnswerLike, 'answer', answer_id)
+
+async def vote(request, model, like_model, kind, object_id):
+    # Строка голоса пишется сразу, счетчики и карточка обновляются через coalescer
+    if not await model.objects.filter(pk=object_id).aexists():
+        raise Http404
     value = 1 if request.POST.get('action') == 'like' else -1
-    
-    like, created = AnswerLike.objects.get_or_create(
-        answer=answer,
-        user=request.user,
-        defaults={'value': value}
-    )
-    
-    if not created:
-        if like.value == value:
-            like.delete()
-        else:
-            like.value = value
-            like.save()
-    
-    likes_count = AnswerLike.objects.filter(answer=answer, value=1).count()
-    dislikes_count = AnswerLike.objects.filter(answer=answer, value=-1).count()
-    
+
+    user = await request.auser()
+    like_delta, dislike_delta = await like_model.objects.atoggle(object_id, user, value)
+    await coalescer.asubmit(kind, object_id, like_delta, dislike_delta)
+
+    likes_count, dislikes_count = await coalescer.acounts(kind, object_id)
     return JsonResponse({
         'likes_count': likes_count,
         'dislikes_count': dislikes_count
     })
 
 @require_POST
+@ratelimit('mark_correct')
 @login_required
 def mark_correct_answer(request, answer_id):
     return setRightAnswerResponse(request, answer_id)
 
+
+@user_passes_test(lambda user: user.is_staff, login_url=reverse_lazy('login'))
+def request_stats(request):
+    return JsonResponse(instrumentation.view_stats())
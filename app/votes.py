@@ -0,0 +1,127 @@
+import atexit
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+
+from app.cards import bump_answer_card, bump_question_card
+from app.events import publish_question_event
+from app.models import Answer, Question
+
+# Объединение записей счетчиков голосов. Строка голоса (QuestionLike/AnswerLike)
+# пишется сразу - у каждого пользователя своя строка, блокировок между ними нет.
+# Изменения счетчиков вопроса или ответа копятся в памяти процесса и раз в
+# VOTE_COALESCE_WINDOW секунд записываются одним UPDATE на объект, вместе с
+# hot_score и версией карточки. Так шторм голосов за один вопрос - это один
+# UPDATE его строки за окно, а не очередь запросов на блокировку строки.
+# Дельты складываются через F(), поэтому несколько процессов не мешают друг другу.
+# После записи новые счетчики публикуются в поток событий страницы вопроса
+
+logger = logging.getLogger(__name__)
+
+# Модель, сброс версии карточки и поле с id вопроса для канала событий
+KINDS = {
+    'question': (Question, bump_question_card, 'id'),
+    'answer': (Answer, bump_answer_card, 'question_id'),
+}
+
+
+class VoteCoalescer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+
+    def add(self, kind, object_id, like_delta, dislike_delta):
+        # Возвращает True, если сброс должен выполнить вызывающий (окно равно нулю)
+        with self.lock:
+            deltas = self.pending.setdefault((kind, object_id), [0, 0])
+            deltas[0] += like_delta
+            deltas[1] += dislike_delta
+            window = settings.VOTE_COALESCE_WINDOW
+            if window and self.timer is None:
+                self.timer = threading.Timer(window, self.flush_in_thread)
+                self.timer.daemon = True
+                self.timer.start()
+        return not window
+
+    def submit(self, kind, object_id, like_delta, dislike_delta):
+        if (like_delta or dislike_delta) and self.add(kind, object_id, like_delta, dislike_delta):
+            self.flush()
+
+    def pending_deltas(self, kind, object_id):
+        with self.lock:
+            return tuple(self.pending.get((kind, object_id), (0, 0)))
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not pending:
+            return
+
+        try:
+            with transaction.atomic():
+                for (kind, object_id), (like_delta, dislike_delta) in sorted(pending.items()):
+                    if like_delta or dislike_delta:
+                        KINDS[kind][0].objects.apply_vote_deltas(object_id, like_delta, dislike_delta)
+                question_ids = [object_id for kind, object_id in pending if kind == 'question']
+                if question_ids:
+                    Question.objects.refresh_hot_scores(Question.objects.filter(pk__in=question_ids))
+        except Exception:
+            # Дельты возвращаются в очередь и будут записаны следующим сбросом
+            logger.exception('Failed to flush %d vote counters', len(pending))
+            for (kind, object_id), (like_delta, dislike_delta) in pending.items():
+                self.add(kind, object_id, like_delta, dislike_delta)
+            raise
+
+        for kind, (model, bump, question_field) in KINDS.items():
+            ids = [object_id for pending_kind, object_id in pending if pending_kind == kind]
+            if ids:
+                rows = vote_counts(model, question_field, ids)
+                bump(*ids, threads={row[question_field] for row in rows})
+                publish_vote_counts(kind, question_field, rows)
+
+    def flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception:
+            # Уже записано в лог в flush(), поток таймера просто завершается
+            pass
+        finally:
+            connection.close()
+
+    async def asubmit(self, kind, object_id, like_delta, dislike_delta):
+        if (like_delta or dislike_delta) and self.add(kind, object_id, like_delta, dislike_delta):
+            # Без окна сброс идет сразу и обращается к базе
+            await sync_to_async(self.flush)()
+
+    async def acounts(self, kind, object_id):
+        # Сохраненные счетчики плюс еще не записанные изменения этого процесса
+        model = KINDS[kind][0]
+        stored = await model.objects.filter(pk=object_id).values('like_count', 'dislike_count').aget()
+        like_delta, dislike_delta = self.pending_deltas(kind, object_id)
+        return stored['like_count'] + like_delta, stored['dislike_count'] + dislike_delta
+
+
+def vote_counts(model, question_field, ids):
+    fields = dict.fromkeys(['id', question_field, 'like_count', 'dislike_count'])
+    return list(model.objects.filter(pk__in=ids).values(*fields))
+
+
+def publish_vote_counts(kind, question_field, rows):
+    for row in rows:
+        publish_question_event(row[question_field], 'votes', {
+            'kind': kind,
+            'id': row['id'],
+            'likes_count': row['like_count'],
+            'dislikes_count': row['dislike_count'],
+        })
+
+
+coalescer = VoteCoalescer()
+atexit.register(coalescer.flush)
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.instrumentation.InstrumentationMiddleware',
+    'app.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +57,7 @@ ROOT_URLCONF = 'askme_voronin.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'app.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [
             'templates'
             ],
@@ -89,6 +91,88 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения (app/routers.py): алиасы из DATABASES, между которыми
+# распределяются GET-запросы. Например, для локальной проверки на SQLite:
+#   DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3',
+#                           'TEST': {'MIRROR': 'default'}}
+#   DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['app.routers.ReplicaRouter']
+
+# Сколько секунд после записи запросы пользователя читают из default
+REPLICA_PIN_SECONDS = 5
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Сколько живут список популярных тегов и отрендеренный сайдбар (в секундах).
+# Инвалидация происходит явно, таймаут нужен для процессов с локальным кэшем
+POPULAR_TAGS_TIMEOUT = 300
+
+# Отрендеренные карточки вопросов и ответов (app/cards.py)
+CARD_CACHE_TIMEOUT = 600
+
+# Страницы для анонимных читателей (app/pagecache.py): сколько хранятся на сервере
+# и сколько их могут держать браузер и прокси (max-age, s-maxage). Серверная копия
+# сбрасывается сменой версии, прокси об изменениях не узнает - поэтому его срок короче
+ANONYMOUS_PAGE_TIMEOUT = 60
+ANONYMOUS_PAGE_MAX_AGE = 10
+
+# Как часто индекс подсказки тегов перечитывается из базы (app/suggest.py), в секундах
+TAG_SUGGEST_REFRESH = 300
+
+# Сколько последних запросов каждого view хранится для перцентилей (app/instrumentation.py).
+# Строки замеров пишутся в логгер app.instrumentation с уровнем INFO
+INSTRUMENTATION_BUFFER_SIZE = 1000
+
+# Окно объединения записей счетчиков голосов в секундах (app/votes.py).
+# 0 - счетчики пишутся сразу в том же запросе
+VOTE_COALESCE_WINDOW = 0.05
+
+# Брокер событий для SSE-потоков страниц вопросов (app/events.py).
+# LocalBroker работает в пределах одного процесса
+EVENT_BROKER = 'app.events.LocalBroker'
+# Живые обновления страниц вопросов. Работают только под ASGI (askme_voronin/asgi.py),
+# под WSGI (runserver, gunicorn без uvicorn-воркеров) выключаются автоматически
+QUESTION_EVENTS = True
+
+# Лимиты запросов на запись (app/ratelimit.py): "число/период", период - s, m, h или d.
+# Считаются на пользователя, для анонимных - на IP; сверх лимита - ответ 429
+RATE_LIMITS = {
+    'vote': '60/m',
+    'answer': '10/m',
+    'ask': '5/m',
+    'mark_correct': '30/m',
+}
+
+# Очередь фоновых задач (app/tasks.py), выполняет ее команда run_worker.
+# Воркеру нужен общий с веб-процессами кэш (Redis, Memcached): с LocMemCache
+# он не запускается, потому что его сброс кэша не дошел бы до сайта.
+# Неудачная попытка повторяется через TASK_RETRY_DELAY * 2^(попытка - 1) секунд;
+# задача, чей воркер не завершил ее за TASK_LEASE секунд, выдается снова
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_LEASE = 300
+TASK_POLL_INTERVAL = 1
+# Сколько дней хранятся выполненные и окончательно упавшие задачи
+TASK_KEEP_FINISHED_DAYS = 7
+
+# Сессия хранится в подписанной cookie, а пользователь с профилем - в кэше
+# (app/backends.py), поэтому обычный запрос не обращается к базе ни за тем, ни за другим
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+AUTHENTICATION_BACKENDS = [
+    'app.backends.CachedModelBackend',
+]
+
+AUTH_USER_CACHE_TIMEOUT = 300
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -127,6 +211,21 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+# Сюда build_assets пишет уменьшенные файлы с хэшем в имени, .gz/.br и манифест
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Вне отладки {% static %} берет хэшированные имена из манифеста build_assets
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG else 'app.assets.AssetStorage',
+    },
+}
+
+# Отдавать собранную статику из Django (app.assets.serve_asset), если перед ним нет nginx
+SERVE_STATIC_ASSETS = not DEBUG
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -14,12 +14,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 
 from app import urls
+from app.assets import serve_asset
 
 urlpatterns = [
     path('', include("app.urls")),
     path('admin/', admin.site.urls),
-]
\ No newline at end of file
+]
+
+if settings.SERVE_STATIC_ASSETS:
+    urlpatterns += [
+        re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.+)$', serve_asset),
+    ]
\ No newline at end of file
@@ -17,10 +17,43 @@ function getCookie(name) {
 
 const csrftoken = getCookie('csrftoken')
 
+// Голоса пользователя за карточки страницы (json_script в base.html): {question: {id: 1 | -1}, answer: {...}}
+const myVotesElement = document.getElementById('my-votes');
+const myVotes = myVotesElement ? JSON.parse(myVotesElement.textContent) : {question: {}, answer: {}};
+
+function setVoteState(objectType, id) {
+    const value = myVotes[objectType][id] || 0;
+    const likeButton = document.querySelector(`button[data-${objectType}-like-id="${id}"]`);
+    const dislikeButton = document.querySelector(`button[data-${objectType}-dislike-id="${id}"]`);
+    if (likeButton && dislikeButton) {
+        likeButton.classList.toggle('active', value === 1);
+        likeButton.setAttribute('aria-pressed', value === 1);
+        dislikeButton.classList.toggle('active', value === -1);
+        dislikeButton.setAttribute('aria-pressed', value === -1);
+    }
+}
+
+function toggleVote(objectType, id, value) {
+    // Та же логика, что у VoteManager.toggle: повторный голос снимается, противоположный заменяет
+    myVotes[objectType][id] = myVotes[objectType][id] === value ? 0 : value;
+    setVoteState(objectType, id);
+}
+
+function setCounters(objectType, id, likesCount, dislikesCount) {
+    // Счетчики ищутся внутри кнопок: у вопроса и ответа может быть одинаковый id
+    const likeCounter = document.querySelector(`button[data-${objectType}-like-id="${id}"] .count`);
+    const dislikeCounter = document.querySelector(`button[data-${objectType}-dislike-id="${id}"] .count`);
+    if (likeCounter && dislikeCounter) {
+        likeCounter.innerText = likesCount;
+        dislikeCounter.innerText = dislikesCount;
+    }
+}
+
 function setupLikeButtons(buttons, objectType, action) {
     for (const item of buttons) {
+        const id = item.dataset[`${objectType}${action.charAt(0).toUpperCase() + action.slice(1)}Id`];
+        setVoteState(objectType, id);
         item.addEventListener('click', (e) => {
-            const id = item.dataset[`${objectType}${action.charAt(0).toUpperCase() + action.slice(1)}Id`];
             const url = `/${objectType}/${id}/like`;
 
             const formData = new FormData();
@@ -37,17 +70,34 @@ function setupLikeButtons(buttons, objectType, action) {
             );
             
             fetch(request).then(response => {
-                response.json().then((data) => {
-                    const likeCounter = document.querySelector(`span[data-like-counter="${id}"]`);
-                    const dislikeCounter = document.querySelector(`span[data-dislike-counter="${id}"]`);
-                    likeCounter.innerText = data.likes_count;
-                    dislikeCounter.innerText = data.dislikes_count;
-                })
-            })
+                if (response.status === 429) {
+                    throttleButton(item, Number(response.headers.get('Retry-After')) || 1);
+                }
+                if (!response.ok) {
+                    throw new Error('Network response was not ok');
+                }
+                return response.json();
+            }).then(data => {
+                setCounters(objectType, id, data.likes_count, data.dislikes_count);
+                toggleVote(objectType, id, action === 'dislike' ? -1 : 1);
+            }).catch(error => {
+                console.error('Error:', error);
+            });
         });
     }
 }
 
+function throttleButton(button, seconds) {
+    // Ответ 429 (app/ratelimit.py): кнопка недоступна, пока лимит не восстановится
+    const title = button.title;
+    button.disabled = true;
+    button.title = `Too many votes, try again in ${seconds} s`;
+    setTimeout(() => {
+        button.disabled = false;
+        button.title = title;
+    }, seconds * 1000);
+}
+
 function onRightAnswerClick(event) {
     const answerId = event.target.dataset.answerId;
     const questionId = event.target.dataset.questionId;
@@ -73,30 +123,121 @@ function onRightAnswerClick(event) {
         }
         return response.json();
     }).then(data => {
-        const label = document.querySelector(`label[for="btn-check${answerId}"]`);
-        if (data.is_correct) {
-            label.classList.add('active');
-        } else {
-            label.classList.remove('active');
-        }
-        event.target.checked = data.is_correct;
+        setCorrect(answerId, data.is_correct);
     }).catch(error => {
         console.error('Error:', error);
         event.target.checked = !event.target.checked;
     });
 }
 
-function init() {
-    const questionLikeButtons = document.querySelectorAll('button[data-question-like-id]');
-    const questionDislikeButtons = document.querySelectorAll('button[data-question-dislike-id]');
+function setCorrect(answerId, isCorrect) {
+    const input = document.getElementById(`btn-check${answerId}`);
+    if (input) {
+        input.checked = isCorrect;
+        const label = document.querySelector(`label[for="btn-check${answerId}"]`);
+        label.classList.toggle('active', isCorrect);
+    }
+    const mark = document.querySelector(`[data-correct-mark="${answerId}"]`);
+    if (mark) {
+        mark.hidden = !isCorrect;
+    }
+}
+
+function setupVoteButtons(root) {
+    const questionLikeButtons = root.querySelectorAll('button[data-question-like-id]');
+    const questionDislikeButtons = root.querySelectorAll('button[data-question-dislike-id]');
     setupLikeButtons(questionLikeButtons, 'question', 'like');
     setupLikeButtons(questionDislikeButtons, 'question', 'dislike');
 
-    const answerLikeButtons = document.querySelectorAll('button[data-answer-like-id]');
-    const answerDislikeButtons = document.querySelectorAll('button[data-answer-dislike-id]');
+    const answerLikeButtons = root.querySelectorAll('button[data-answer-like-id]');
+    const answerDislikeButtons = root.querySelectorAll('button[data-answer-dislike-id]');
     setupLikeButtons(answerLikeButtons, 'answer', 'like');
     setupLikeButtons(answerDislikeButtons, 'answer', 'dislike')
+}
+
+function setupQuestionEvents() {
+    // Живые обновления страницы вопроса через SSE (views.question_events)
+    const container = document.querySelector('section[data-question-events]');
+    if (!container || !window.EventSource) {
+        return;
+    }
+    const source = new EventSource(container.dataset.questionEvents);
 
+    source.addEventListener('votes', (e) => {
+        const data = JSON.parse(e.data);
+        setCounters(data.kind, data.id, data.likes_count, data.dislikes_count);
+    });
+
+    source.addEventListener('answer', (e) => {
+        const data = JSON.parse(e.data);
+        document.querySelector('span[data-answer-count]').innerText = data.answer_count;
+        // Новый ответ добавляется только на последнюю страницу, остальные просто обновляют счетчик
+        if (!('lastPage' in container.dataset) || document.getElementById(`answer-${data.id}`)) {
+            return;
+        }
+        const template = document.createElement('template');
+        template.innerHTML = data.html.trim();
+        const article = template.content.firstElementChild;
+        container.appendChild(article);
+        setupVoteButtons(article);
+    });
+
+    source.addEventListener('correct', (e) => {
+        const data = JSON.parse(e.data);
+        for (const answerId of data.unmarked) {
+            setCorrect(answerId, false);
+        }
+        setCorrect(data.id, data.is_correct);
+    });
+}
+
+function setupTagSuggest() {
+    // Подсказка для последнего тега в списке через запятую (views.tag_suggest)
+    const input = document.querySelector('input[data-tag-suggest]');
+    if (!input) {
+        return;
+    }
+    const datalist = document.createElement('datalist');
+    datalist.id = input.getAttribute('list');
+    input.after(datalist);
+
+    let timer = null;
+    let controller = null;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            const parts = input.value.split(',');
+            const prefix = parts.pop().trim();
+            const head = parts.map(part => part.trim()).filter(Boolean);
+            if (!prefix) {
+                datalist.replaceChildren();
+                return;
+            }
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(`${input.dataset.tagSuggest}?q=${encodeURIComponent(prefix)}`, {signal: controller.signal})
+                .then(response => response.json())
+                .then(data => {
+                    datalist.replaceChildren(...data.tags
+                        .filter(tag => !head.includes(tag.name))
+                        .map(tag => {
+                            const option = document.createElement('option');
+                            option.value = [...head, tag.name].join(', ');
+                            option.label = `${tag.name} (${tag.question_count})`;
+                            return option;
+                        }));
+                })
+                .catch(() => {});
+        }, 150);
+    });
+}
+
+function init() {
+    setupVoteButtons(document);
+    setupQuestionEvents();
+    setupTagSuggest();
 }
 
 if (document.readyState === 'loading') {